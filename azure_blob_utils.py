@@ -1,54 +1,294 @@
+import hashlib
 import os
-from datetime import datetime, timedelta
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from datetime import datetime, timedelta, timezone
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, ContentSettings, generate_blob_sas, BlobSasPermissions
+
+from metrics import REGISTRY
 
 AZURE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_BLOB_CONTAINER = os.getenv("AZURE_BLOB_CONTAINER", "lms")
 
-# Init client
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-container_client = blob_service_client.get_container_client(AZURE_BLOB_CONTAINER)
+# Blobs up to BLOB_MAX_SINGLE_PUT_SIZE go up in one request; larger ones in
+# BLOB_MAX_BLOCK_SIZE blocks, BLOB_UPLOAD_MAX_CONCURRENCY at a time
+BLOB_MAX_SINGLE_PUT_SIZE = int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", str(8 * 1024 * 1024)))
+BLOB_MAX_BLOCK_SIZE = int(os.getenv("BLOB_MAX_BLOCK_SIZE", str(4 * 1024 * 1024)))
+BLOB_UPLOAD_MAX_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_MAX_CONCURRENCY", "4"))
+
+# Lifetime of the read-only SAS URLs we hand out (default 10 years, as before)
+BLOB_SAS_EXPIRY_HOURS = float(os.getenv("BLOB_SAS_EXPIRY_HOURS", str(3650 * 24)))
+# A cached URL is re-signed once less than this fraction of its lifetime is left
+BLOB_SAS_REFRESH_MARGIN = float(os.getenv("BLOB_SAS_REFRESH_MARGIN", "0.5"))
+BLOB_SAS_CACHE_SIZE = int(os.getenv("BLOB_SAS_CACHE_SIZE", "20000"))
+
+# Skip uploads whose MD5 matches the blob's Content-MD5 (bytes and files; streams always upload)
+BLOB_SKIP_UNCHANGED = os.getenv("BLOB_SKIP_UNCHANGED", "true").lower() in ("1", "true", "yes")
+BLOB_HASH_MANIFEST_SIZE = int(os.getenv("BLOB_HASH_MANIFEST_SIZE", "10000"))
+# Conditional writes that lose a race are re-checked this many times, then the upload fails
+BLOB_CONDITIONAL_ATTEMPTS = 2
+
+BlobData = Union[bytes, bytearray, BinaryIO, str]
+
+BLOB_UPLOAD_BYTES = REGISTRY.counter(
+    "blob_upload_bytes_total", "Bytes uploaded, or skipped because the blob already had them", ("result",))
+
+_blob_service_client = None
+_container_client = None
+
+# Called with (blob_name, size) after every successful upload (e.g. by blob_catalog)
+UploadListener = Callable[[str, Optional[int]], None]
+_upload_listeners: List[UploadListener] = []
+
+# blob name -> (Content-MD5, ETag) of what we last wrote or saw there
+_manifest_lock = threading.Lock()
+_manifest: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+
+
+@dataclass(slots=True)
+class UploadResult:
+    url: str
+    # False when the blob already held these bytes and nothing was sent
+    transferred: bool
+    size: Optional[int] = None
+    etag: Optional[str] = None
+
+
+def get_container_client():
+    """Create the client on first use, so importing this module needs no storage account."""
+    global _blob_service_client, _container_client
+    if _container_client is None:
+        service_client = BlobServiceClient.from_connection_string(
+            AZURE_CONNECTION_STRING,
+            max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE,
+            max_block_size=BLOB_MAX_BLOCK_SIZE,
+        )
+        container_client = service_client.get_container_client(AZURE_BLOB_CONTAINER)
+
+        # Ensure container exists
+        try:
+            container_client.create_container()
+            print(f"[INFO] Container '{AZURE_BLOB_CONTAINER}' created.")
+        except Exception:
+            print(f"[INFO] Using existing container '{AZURE_BLOB_CONTAINER}'.")
+        _blob_service_client, _container_client = service_client, container_client
+    return _container_client
+
+
+def get_blob_service_client():
+    get_container_client()
+    return _blob_service_client
+
+
+def __getattr__(name):
+    # keeps `from azure_blob_utils import blob_service_client` working
+    if name == "blob_service_client":
+        return get_blob_service_client()
+    if name == "container_client":
+        return get_container_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def add_upload_listener(listener: UploadListener) -> None:
+    _upload_listeners.append(listener)
+
+
+def notify_uploaded(blob_name: str, size: Optional[int]) -> None:
+    for listener in _upload_listeners:
+        try:
+            listener(blob_name, size)
+        except Exception as e:
+            print(f"[WARN] Upload listener failed for {blob_name}: {e}")
+
+
+def content_md5(data: Union[bytes, bytearray, str]) -> bytes:
+    """MD5 of bytes or of a local file (path), as the service stores it in Content-MD5."""
+    digest = hashlib.md5(usedforsecurity=False)
+    if isinstance(data, str):
+        with open(data, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        digest.update(data)
+    return digest.digest()
+
+
+def manifest_get(blob_name: str) -> Optional[Tuple[bytes, str]]:
+    with _manifest_lock:
+        return _manifest.get(blob_name)
+
+
+def manifest_put(blob_name: str, md5: Optional[bytes], etag: Optional[str]) -> None:
+    with _manifest_lock:
+        if md5 is None or etag is None:
+            _manifest.pop(blob_name, None)
+            return
+        _manifest[blob_name] = (md5, etag)
+        _manifest.move_to_end(blob_name)
+        while len(_manifest) > BLOB_HASH_MANIFEST_SIZE:
+            _manifest.popitem(last=False)
+
+
+def describe_upload(data: BlobData) -> Tuple[str, Optional[int]]:
+    """("path" | "bytes" | "stream", size or None)."""
+    if isinstance(data, str):
+        return "path", os.path.getsize(data)
+    if isinstance(data, (bytes, bytearray)):
+        return "bytes", len(data)
+    return "stream", None
+
+
+def blob_is_current(props: Any, md5: bytes, size: Optional[int]) -> bool:
+    stored = props.content_settings.content_md5
+    return props.size == size and stored is not None and bytes(stored) == md5
+
+
+def upload_kwargs(size: Optional[int], md5: Optional[bytes], etag: Optional[str], create: bool) -> Dict[str, Any]:
+    """
+    upload_blob() arguments: Content-MD5 recorded for the next comparison, and
+    the write made conditional on the ETag we compared against (`create`:
+    only if the blob still does not exist).
+    """
+    kwargs: Dict[str, Any] = {"overwrite": not create, "length": size,
+                              "max_concurrency": BLOB_UPLOAD_MAX_CONCURRENCY}
+    if md5 is not None:
+        kwargs["content_settings"] = ContentSettings(content_md5=bytearray(md5))
+    if etag is not None:
+        kwargs.update(etag=etag, match_condition=MatchConditions.IfNotModified)
+    return kwargs
+
+
+# A conditional write lost to another writer (or the blob was deleted under it)
+CONDITION_FAILED = (ResourceModifiedError, ResourceExistsError, ResourceNotFoundError)
 
-# Ensure container exists
-try:
-    container_client.create_container()
-    print(f"[INFO] Container '{AZURE_BLOB_CONTAINER}' created.")
-except Exception:
-    print(f"[INFO] Using existing container '{AZURE_BLOB_CONTAINER}'.")
+
+class UploadPlan:
+    """
+    What to send for one upload, shared by put_blob and blob_storage.upload_blob,
+    which only do the I/O:
+
+        plan = UploadPlan(blob_name, md5, size)
+        while True:
+            if plan.needs_props and plan.is_current(<HEAD, None if missing>):
+                -> skipped, plan.etag
+            try:
+                -> sent, <upload_blob(data, **plan.put_kwargs())>
+            except CONDITION_FAILED as e:
+                plan.conflict(e)
+
+    Without an md5 (streams, BLOB_SKIP_UNCHANGED off) it is one plain overwrite.
+    Otherwise the blob is only looked at when the manifest doesn't know it or
+    thinks it already has these bytes, and every write is conditional on the
+    ETag that was compared; conflict() re-raises after BLOB_CONDITIONAL_ATTEMPTS
+    rather than overwriting someone else's write.
+    """
+
+    __slots__ = ("blob_name", "md5", "size", "etag", "needs_props", "attempts")
+
+    def __init__(self, blob_name: str, md5: Optional[bytes], size: Optional[int]):
+        self.blob_name, self.md5, self.size = blob_name, md5, size
+        self.attempts = 0
+        known = manifest_get(blob_name) if md5 is not None else None
+        self.needs_props = md5 is not None and (known is None or known[0] == md5)
+        self.etag = known[1] if known is not None and not self.needs_props else None
+
+    def is_current(self, props: Any) -> bool:
+        """Take the blob's properties (None: no such blob); True when it already holds these bytes."""
+        self.needs_props = False
+        self.etag = props.etag if props is not None else None
+        return props is not None and blob_is_current(props, self.md5, self.size)
+
+    def put_kwargs(self) -> Dict[str, Any]:
+        return upload_kwargs(self.size, self.md5, self.etag, create=self.md5 is not None and self.etag is None)
+
+    def conflict(self, error: Exception) -> None:
+        self.attempts += 1
+        if self.attempts >= BLOB_CONDITIONAL_ATTEMPTS:
+            manifest_put(self.blob_name, None, None)
+            print(f"[WARN] {self.blob_name} kept changing while uploading, giving up after "
+                  f"{self.attempts} attempts: {error}")
+            raise error
+        print(f"[WARN] {self.blob_name} changed while uploading, comparing again")
+        self.needs_props = True
+
+
+def uploaded(blob_name: str, size: Optional[int], transferred: bool = True,
+             md5: Optional[bytes] = None, etag: Optional[str] = None) -> UploadResult:
+    """After a successful (or skipped) upload: record it, tell the listeners and sign the URL."""
+    manifest_put(blob_name, md5, etag)
+    BLOB_UPLOAD_BYTES.inc(size or 0, result="transferred" if transferred else "skipped")
+    if transferred:
+        notify_uploaded(blob_name, size)
+    sas_url = get_blob_sas_url(blob_name)
+    if transferred:
+        print(f"[UPLOAD-SUCCESS] SAS URL (expires in ~{sas_signer.expiry_text}): {sas_url}")
+    else:
+        print(f"[UPLOAD-SKIPPED] {blob_name} is unchanged ({size} bytes)")
+    return UploadResult(sas_url, transferred, size, etag)
+
+
+def put_blob(data: BlobData, blob_name: str) -> UploadResult:
+    """
+    Upload bytes, a readable stream or a local file (path) unless the blob
+    already holds the same bytes. The local MD5 is compared with the blob's
+    Content-MD5 (one HEAD, skipped when the manifest shows the content changed)
+    and the write is conditional on the ETag that was compared (see UploadPlan).
+    """
+    kind, size = describe_upload(data)
+    print(f"[UPLOAD] {data if kind == 'path' else f'{size if size is not None else kind} bytes'} -> {blob_name}")
+    blob_client = get_container_client().get_blob_client(blob_name)
+
+    def put(**kwargs) -> str:
+        if kind == "path":
+            with open(data, "rb") as f:
+                return blob_client.upload_blob(f, **kwargs)["etag"]
+        return blob_client.upload_blob(data, **kwargs)["etag"]
+
+    def props() -> Any:
+        try:
+            return blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+
+    md5 = content_md5(data) if kind != "stream" and BLOB_SKIP_UNCHANGED else None
+    plan = UploadPlan(blob_name, md5, size)
+    while True:
+        if plan.needs_props and plan.is_current(props()):
+            return uploaded(blob_name, size, transferred=False, md5=md5, etag=plan.etag)
+        try:
+            return uploaded(blob_name, size, md5=md5, etag=put(**plan.put_kwargs()))
+        except CONDITION_FAILED as e:
+            plan.conflict(e)
 
 
 def upload_file_to_blob(local_file_path: str, blob_name: str) -> str:
     """
-    Upload a file to Azure Blob and return a SAS URL (read-only, expires in 10 years).
+    Upload a file to Azure Blob (unless unchanged) and return a read-only SAS URL
+    (see BLOB_SAS_EXPIRY_HOURS).
     """
-    print(f"[UPLOAD] {local_file_path} -> {blob_name}")
+    return put_blob(local_file_path, blob_name).url
 
-    blob_client = container_client.get_blob_client(blob_name)
 
-    # Upload file
-    with open(local_file_path, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True)
+def upload_bytes_to_blob(data: Union[bytes, BinaryIO], blob_name: str) -> str:
+    """
+    Upload in-memory bytes (or a readable stream) and return a SAS URL, like upload_file_to_blob.
+    """
+    return put_blob(data, blob_name).url
 
-    # Generate SAS token (10 years expiry)
-    sas_token = generate_blob_sas(
-        account_name=blob_service_client.account_name,
-        container_name=AZURE_BLOB_CONTAINER,
-        blob_name=blob_name,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(days=3650),  # ~10 years
-        account_key=blob_service_client.credential.account_key
-    )
 
-    # SAS URL
-    sas_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_BLOB_CONTAINER}/{blob_name}?{sas_token}"
-    print(f"[UPLOAD-SUCCESS] SAS URL (expires in ~10 years): {sas_url}")
+def blob_exists(blob_name: str) -> bool:
+    return get_container_client().get_blob_client(blob_name).exists()
 
-    return sas_url
 
 def list_all_scorm_files():
     """Return all .zip SCORM files in container."""
     files = []
-    for blob in container_client.list_blobs():
+    for blob in get_container_client().list_blobs():
         if blob.name.endswith(".zip"):
             files.append(blob.name)
     return files
@@ -69,24 +309,106 @@ def list_blobs_in_container():
     List all blobs inside the container.
     """
     print(f"[DEBUG] Listing blobs in container '{AZURE_BLOB_CONTAINER}':")
-    blobs = container_client.list_blobs()
+    blobs = get_container_client().list_blobs()
     for blob in blobs:
         print(f" - {blob.name}")
 
+class BlobSasSigner:
+    """
+    Read-only SAS URLs for blobs in the container, cached per blob name.
+
+    Signing is an HMAC over the token fields, ~50us each, which adds up when
+    a listing signs thousands of results. A cached URL is reused until less
+    than `refresh_margin` of its lifetime is left, so every URL handed out
+    is still valid for at least that long. sign_many() signs a whole result
+    page with one lock round trip and one expiry for all the misses.
+    """
+
+    def __init__(self, expiry: timedelta = timedelta(hours=BLOB_SAS_EXPIRY_HOURS),
+                 refresh_margin: float = BLOB_SAS_REFRESH_MARGIN, max_entries: int = BLOB_SAS_CACHE_SIZE):
+        self.expiry = expiry
+        self.refresh_margin = min(max(refresh_margin, 0.0), 1.0)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # blob name -> (re-sign after this time.time(), url)
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._stats = {"hits": 0, "signed": 0}
+
+    @property
+    def expiry_text(self) -> str:
+        hours = self.expiry.total_seconds() / 3600
+        return f"{hours / 24:g} days" if hours >= 48 else f"{hours:g} hours"
+
+    def _sign(self, blob_names: Sequence[str]) -> Dict[str, str]:
+        client = get_blob_service_client()
+        account_name, account_key = client.account_name, client.credential.account_key
+        base = f"https://{account_name}.blob.core.windows.net/{AZURE_BLOB_CONTAINER}/"
+        expiry = datetime.now(timezone.utc) + self.expiry
+        permission = BlobSasPermissions(read=True)
+        return {
+            name: base + name + "?" + generate_blob_sas(
+                account_name=account_name,
+                container_name=AZURE_BLOB_CONTAINER,
+                blob_name=name,
+                permission=permission,
+                expiry=expiry,
+                account_key=account_key,
+            )
+            for name in blob_names
+        }
+
+    def sign(self, blob_name: str) -> str:
+        return self.sign_many([blob_name])[0]
+
+    def sign_many(self, blob_names: Sequence[str]) -> List[str]:
+        """SAS URLs for `blob_names`, in the same order."""
+        now = time.time()
+        urls: Dict[str, str] = {}
+        with self._lock:
+            for name in blob_names:
+                cached = self._cache.get(name)
+                if cached is not None and cached[0] > now:
+                    self._cache.move_to_end(name)
+                    urls[name] = cached[1]
+            self._stats["hits"] += len(urls)
+
+        missing = [name for name in dict.fromkeys(blob_names) if name not in urls]
+        if missing:
+            signed = self._sign(missing)
+            refresh_at = now + self.expiry.total_seconds() * (1 - self.refresh_margin)
+            with self._lock:
+                for name, url in signed.items():
+                    self._cache[name] = (refresh_at, url)
+                    self._cache.move_to_end(name)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                self._stats["signed"] += len(signed)
+            urls.update(signed)
+        return [urls[name] for name in blob_names]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._cache))
+
+
+sas_signer = BlobSasSigner()
+
+REGISTRY.callback(
+    "blob_sas_signer", "SAS URL cache (hits, signed, entries)", "gauge",
+    lambda: [({"stat": k}, v) for k, v in sas_signer.stats().items()])
+
+
 def get_blob_sas_url(blob_name: str) -> str:
     """
-    Generate a SAS URL for an existing blob (without re-upload).
+    SAS URL for an existing blob (without re-upload).
     """
-    from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-    from datetime import datetime, timedelta
+    return sas_signer.sign(blob_name)
 
-    sas_token = generate_blob_sas(
-        account_name=blob_service_client.account_name,
-        container_name=AZURE_BLOB_CONTAINER,
-        blob_name=blob_name,
-        permission=BlobSasPermissions(read=True),
-        expiry=datetime.utcnow() + timedelta(days=3650),  # 10 years
-        account_key=blob_service_client.credential.account_key
-    )
-    return f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_BLOB_CONTAINER}/{blob_name}?{sas_token}"
 
+def get_blob_sas_urls(blob_names: Sequence[str]) -> List[str]:
+    """SAS URLs for a page of blobs, in the same order."""
+    return sas_signer.sign_many(blob_names)
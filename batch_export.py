@@ -0,0 +1,254 @@
+# batch_export.py
+"""
+Rebuild the SCORM package of every course in the local store, e.g. after the
+exporter templates change.
+
+    python batch_export.py --workers 8 --upload
+
+Finds detailed_courses/*/outline.txt, rebuilds each package in a process
+pool (assessment settings, course_id and question bank come from
+generated_syllabus/<name>/meta.json) and writes <name>.zip next to the
+outline. With --upload the packages are uploaded in parallel over the blob the
+course currently points at, so existing SAS URLs keep working; packages the
+blob already holds byte for byte are not sent again. Prints per-course timing
+and overall throughput.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from content_pipeline import DETAILED_DIR, GENERATED_DIR, current_package, meta_question_bank, store_question_bank
+
+BATCH_EXPORT_WORKERS = int(os.getenv("BATCH_EXPORT_WORKERS", str(os.cpu_count() or 4)))
+BATCH_UPLOAD_WORKERS = int(os.getenv("BATCH_UPLOAD_WORKERS", "8"))
+
+
+def find_courses(root: str, names: Optional[List[str]] = None) -> List[str]:
+    """Course names under `root` that have an outline.txt (optionally only `names`)."""
+    found = sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, "outline.txt"))
+    ) if os.path.isdir(root) else []
+    if names:
+        wanted = set(names)
+        found = [name for name in found if name in wanted]
+    return found
+
+
+def _read_meta(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _rebuild(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs in a pool process: build one course's package and write it to disk."""
+    from scorm_exporter import build_scorm_package
+
+    name = job["name"]
+    started = time.perf_counter()
+    try:
+        with open(job["outline_path"], "r", encoding="utf-8") as f:
+            text = f.read()
+        meta = _read_meta(job["meta_path"])
+        assessment_type = meta.get("assessment_type")
+        current = current_package(name, meta)
+        course_id = (current or {}).get("course_id") or meta.get("latest_course_id") or meta.get("course_id") or name
+        questions = meta_question_bank(meta, text, assessment_type)
+
+        data = build_scorm_package(
+            text,
+            course_name=name,
+            assessment_type=assessment_type,
+            attempts=meta.get("attempts"),
+            course_id=course_id,
+            compression=job["compression"],
+            level=job["level"],
+            minify=job["minify"],
+            mode=job["mode"],
+            use_cache=job["use_cache"],
+            questions=questions,
+        )
+
+        zip_path = os.path.join(os.path.dirname(job["outline_path"]), f"{name}.zip")
+        tmp_path = f"{zip_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, zip_path)
+
+        # only sent back when meta.json does not have it yet
+        new_meta: Dict[str, Any] = {}
+        if not questions:
+            store_question_bank(new_meta, text, assessment_type)
+    except Exception as e:
+        return {"name": name, "ok": False, "error": str(e), "build_seconds": time.perf_counter() - started}
+
+    return {
+        "name": name,
+        "ok": True,
+        "build_seconds": time.perf_counter() - started,
+        "bytes": len(data),
+        "zip_path": zip_path,
+        "blob": (current or {}).get("blob") or f"{name}.zip",
+        "questions": "meta" if questions else ("exporter" if assessment_type else None),
+        "question_bank": new_meta.get("question_bank"),
+    }
+
+
+def _store_bank(meta_path: str, bank: Dict[str, Any]) -> None:
+    """Record a newly generated question bank in the course's meta.json."""
+    if not os.path.exists(meta_path):
+        return
+    meta = _read_meta(meta_path)
+    meta["question_bank"] = bank
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(_percentile(values, 50), 4),
+        "p95": round(_percentile(values, 95), 4),
+        "mean": round(statistics.fmean(values), 4) if values else 0.0,
+    }
+
+
+def _upload(result: Dict[str, Any]) -> Dict[str, Any]:
+    from azure_blob_utils import put_blob
+
+    started = time.perf_counter()
+    try:
+        result["transferred"] = put_blob(result["zip_path"], result["blob"]).transferred
+    except Exception as e:
+        result.update(ok=False, error=f"upload failed: {e}")
+    result["upload_seconds"] = time.perf_counter() - started
+    return result
+
+
+def run_batch(names: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    jobs = [{
+        "name": name,
+        "outline_path": os.path.join(args.root, name, "outline.txt"),
+        "meta_path": os.path.join(args.meta_root, name, "meta.json"),
+        "compression": args.compression,
+        "level": args.level,
+        "minify": args.minify,
+        "mode": args.mode,
+        "use_cache": not args.no_cache,
+    } for name in names]
+
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    # every job is submitted before the upload threads start, so the pool's processes
+    # are forked from a single-threaded parent
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool, \
+            ThreadPoolExecutor(max_workers=max(1, args.upload_workers)) as uploader:
+        builds = [pool.submit(_rebuild, job) for job in jobs]
+        meta_paths = {job["name"]: job["meta_path"] for job in jobs}
+        uploads = []
+        for future in as_completed(builds):
+            result = future.result()
+            if result["ok"] and result.get("question_bank"):
+                _store_bank(meta_paths[result["name"]], result.pop("question_bank"))
+            result.pop("question_bank", None)
+            if result["ok"] and args.upload:
+                uploads.append(uploader.submit(_upload, result))
+            else:
+                _print_result(result)
+                results.append(result)
+        for future in as_completed(uploads):
+            result = future.result()
+            _print_result(result)
+            results.append(result)
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    report = {
+        "courses": len(results),
+        "failed": len(results) - len(ok),
+        "wall_seconds": round(wall, 3),
+        "courses_per_minute": round(len(ok) / wall * 60, 2) if wall else 0.0,
+        "bytes": sum(r["bytes"] for r in ok),
+        "build": _summary([r["build_seconds"] for r in ok]),
+        "questions_from_meta": sum(1 for r in ok if r["questions"] == "meta"),
+        "results": sorted(results, key=lambda r: r["name"]),
+    }
+    if args.upload:
+        report["upload"] = _summary([r["upload_seconds"] for r in results if "upload_seconds" in r])
+        report["upload"]["unchanged"] = sum(1 for r in ok if r.get("transferred") is False)
+    return report
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    if not result["ok"]:
+        print(f"[ERROR] {result['name']}: {result['error']}")
+        return
+    upload = f", upload {result['upload_seconds']:.3f}s -> {result['blob']}" if "upload_seconds" in result else ""
+    if result.get("transferred") is False:
+        upload += " (unchanged)"
+    questions = f", questions: {result['questions']}" if result["questions"] else ""
+    print(f"[INFO] {result['name']}: build {result['build_seconds']:.3f}s, "
+          f"{result['bytes'] / 1024:.1f} KB{questions}{upload}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the SCORM packages of all local courses.")
+    parser.add_argument("names", nargs="*", help="only rebuild these courses (default: all)")
+    parser.add_argument("--root", default=DETAILED_DIR, help="directory holding <name>/outline.txt")
+    parser.add_argument("--meta-root", default=GENERATED_DIR, help="directory holding <name>/meta.json")
+    parser.add_argument("--workers", type=int, default=BATCH_EXPORT_WORKERS, help="build processes")
+    parser.add_argument("--upload", action="store_true", help="upload each package over its current blob")
+    parser.add_argument("--upload-workers", type=int, default=BATCH_UPLOAD_WORKERS, help="parallel uploads")
+    parser.add_argument("--compression", help="stored | deflate | bzip2 | lzma (default: SCORM_COMPRESSION)")
+    parser.add_argument("--level", type=int, help="compression level")
+    parser.add_argument("--minify", action="store_true", default=None, help="minify HTML/CSS")
+    parser.add_argument("--mode", help="single | multi (default: SCORM_EXPORT_MODE)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the SCORM build cache")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    names = find_courses(args.root, args.names)
+    if not names:
+        print(f"[WARN] No outlines found under {args.root}")
+        sys.exit(1)
+    print(f"[INFO] Rebuilding {len(names)} course(s) with {args.workers} worker(s)"
+          f"{f', uploading with {args.upload_workers}' if args.upload else ''}")
+
+    report = run_batch(names, args)
+
+    print(f"[INFO] {report['courses'] - report['failed']}/{report['courses']} course(s) in "
+          f"{report['wall_seconds']:.2f}s ({report['courses_per_minute']:.1f} courses/min); "
+          f"build p50 {report['build']['p50']:.3f}s p95 {report['build']['p95']:.3f}s; "
+          f"questions from meta: {report['questions_from_meta']}")
+    if args.upload:
+        print(f"[INFO] upload p50 {report['upload']['p50']:.3f}s p95 {report['upload']['p95']:.3f}s; "
+              f"unchanged (skipped): {report['upload']['unchanged']}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.json_path}")
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end benchmark of syllabus -> content -> SCORM -> upload against the
+deterministic fake LLM backend, so runs are repeatable and cost nothing.
+
+    python benchmarks/bench_pipeline.py --modules 1,5,20,50 --users 1,4 --latency 0.2
+
+Each (modules, users) cell runs `--iterations` rounds of `users` concurrent
+courses. Uploads are simulated (latency + bandwidth) unless --real-upload is
+given. Reports p50/p95/mean per stage and end-to-end, plus courses/minute.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(_percentile(values, 50), 4),
+        "p95": round(_percentile(values, 95), 4),
+        "mean": round(statistics.fmean(values), 4) if values else 0.0,
+    }
+
+
+def _simulated_uploader(latency: float, mbps: float):
+    from azure_blob_utils import UploadResult
+
+    async def upload(data, blob_name: str) -> UploadResult:
+        size = len(data) if isinstance(data, (bytes, bytearray)) else os.path.getsize(data)
+        delay = latency + (size * 8 / (mbps * 1_000_000) if mbps > 0 else 0)
+        await asyncio.sleep(delay)
+        return UploadResult(f"https://bench.blob.core.windows.net/lms/{blob_name}?sig=bench", True, size)
+    return upload
+
+
+async def _run_course(modules: int, args: argparse.Namespace) -> Dict[str, Any]:
+    import content_pipeline
+    from generator import generate_syllabus_prompt_async
+
+    request = {
+        "topic": f"Benchmark Topic {uuid.uuid4().hex[:6]}" if not args.cache else "Benchmark Topic",
+        "audience": "beginner",
+        "duration": "04:00",
+        "content_types": None,
+        "assessment_type": args.assessment,
+        "attempts": 2,
+        "modules": modules,
+        "ai_tone": "Formal",
+    }
+    marks = {"start": time.perf_counter()}
+
+    syllabus = await generate_syllabus_prompt_async(request)
+    marks["syllabus"] = time.perf_counter()
+
+    name = f"bench_{modules}_{uuid.uuid4().hex[:8]}"
+    folder = os.path.join(content_pipeline.GENERATED_DIR, name)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "syllabus.txt"), "w", encoding="utf-8") as f:
+        f.write(syllabus)
+    with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as m:
+        json.dump(dict(request, syllabus_id=name), m)
+
+    def on_event(event: str, data: Dict[str, Any]) -> None:
+        now = time.perf_counter()
+        if event == "outline_saved":
+            marks["content"] = now
+        elif event == "scorm_built":
+            marks["scorm"] = now
+        elif event == "uploaded" and data.get("blob", "").endswith(".zip"):
+            marks["upload"] = now
+
+    course = content_pipeline.load_course_request(name)
+    result = await content_pipeline.generate_course_content(course, on_event=on_event)
+    marks.setdefault("upload", time.perf_counter())
+
+    return {
+        "syllabus": marks["syllabus"] - marks["start"],
+        "content": marks["content"] - marks["syllabus"],
+        # the outline upload overlaps the SCORM build; meta.json and the zip go up together after it
+        "scorm": marks["scorm"] - marks["content"],
+        "upload": marks["upload"] - marks["scorm"],
+        "total": marks["upload"] - marks["start"],
+        "modules_built": modules - len(result["failed_modules"]),
+    }
+
+
+async def _run_cell(modules: int, users: int, args: argparse.Namespace) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        samples += await asyncio.gather(*(_run_course(modules, args) for _ in range(users)))
+    wall = time.perf_counter() - started
+    if args.real_upload:
+        from blob_storage import close_blob_storage
+        await close_blob_storage()
+
+    report = {"modules": modules, "users": users, "courses": len(samples), "wall_seconds": round(wall, 3),
+              "courses_per_minute": round(len(samples) / wall * 60, 2) if wall else 0.0}
+    for stage in ("syllabus", "content", "scorm", "upload", "total"):
+        report[stage] = _summary([s[stage] for s in samples])
+    return report
+
+
+def _print_table(reports: List[Dict[str, Any]]) -> None:
+    header = f"{'modules':>7} {'users':>5} {'n':>4} {'total p50':>10} {'total p95':>10} " \
+             f"{'content p50':>12} {'scorm p50':>10} {'upload p50':>11} {'courses/min':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in reports:
+        print(f"{r['modules']:>7} {r['users']:>5} {r['courses']:>4} {r['total']['p50']:>10.3f} "
+              f"{r['total']['p95']:>10.3f} {r['content']['p50']:>12.3f} {r['scorm']['p50']:>10.3f} "
+              f"{r['upload']['p50']:>11.3f} {r['courses_per_minute']:>12.2f}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the course generation pipeline.")
+    parser.add_argument("--modules", type=_int_list, default=[1, 5, 20, 50], help="comma-separated module counts")
+    parser.add_argument("--users", type=_int_list, default=[1], help="comma-separated concurrent user counts")
+    parser.add_argument("--iterations", type=int, default=3, help="rounds per (modules, users) cell")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="fake LLM generation speed, 0 = instant")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="simulated per-blob upload latency (s)")
+    parser.add_argument("--upload-mbps", type=float, default=100.0, help="simulated upload bandwidth, 0 = unlimited")
+    parser.add_argument("--real-upload", action="store_true", help="upload to the configured storage account")
+    parser.add_argument("--cache", action="store_true", help="keep the LLM response cache enabled")
+    parser.add_argument("--assessment", default="MCQ", help="assessment type passed to the SCORM exporter")
+    parser.add_argument("--workdir", help="directory for generated files (default: a temp dir)")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    # must be set before gpt_engine is imported
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["LLM_FAKE_LATENCY"] = str(args.latency)
+    os.environ["LLM_FAKE_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+    if not args.cache:
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+
+    if args.json_path:
+        args.json_path = os.path.abspath(args.json_path)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    print(f"[INFO] Working directory: {workdir}")
+
+    import content_pipeline
+    from gpt_engine import shutdown_engine
+
+    if not args.real_upload:
+        content_pipeline.upload_blob = _simulated_uploader(args.upload_latency, args.upload_mbps)
+
+    reports = []
+    try:
+        for modules in args.modules:
+            for users in args.users:
+                print(f"[INFO] Running {modules} module(s) x {users} user(s) x {args.iterations} iteration(s)")
+                reports.append(asyncio.run(_run_cell(modules, users, args)))
+    finally:
+        shutdown_engine()
+
+    print()
+    _print_table(reports)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": reports}, f, indent=2)
+        print(f"[INFO] Report written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# benchmarks/bench_render.py
+"""
+Course HTML from outline text: course_ast.parse_outline + the current renderer
+against the previous regex-split parser + string-concatenation/chained
+str.replace renderer (kept below as the baseline), both timed from the same
+outline text with nothing cached. Checks that both produce identical output
+before timing, and that the assessment page embeds the full question bank.
+
+    python benchmarks/bench_render.py --modules 10,50,100
+"""
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import timeit
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_parse_course_content(course_text: str):
+    modules = []
+
+    # Split modules correctly
+    raw_modules = re.split(r"-{10,}\s*", course_text)
+
+    for block in raw_modules:
+        if not block.strip():
+            continue
+
+        # Extract module title
+        title_match = re.search(r"Module\s+\d+:\s*(.*)", block)
+        if not title_match:
+            continue
+
+        module_title = title_match.group(1).strip()
+
+        # Remove title line from content
+        content = block.split("\n", 1)
+        content_body = content[1] if len(content) > 1 else ""
+
+        # Split sections (1., 2., 3., 4.)
+        sections = re.split(r"\n\d+\.\s", content_body)
+
+        parsed_sections = []
+        for sec in sections:
+            if not sec.strip():
+                continue
+
+            lines = sec.strip().split("\n", 1)
+            sec_title = lines[0].strip()
+            sec_content = lines[1].strip() if len(lines) > 1 else ""
+
+            parsed_sections.append({
+                "title": sec_title,
+                "content": sec_content
+            })
+
+        modules.append({
+            "title": module_title,
+            "pages": parsed_sections
+        })
+
+    return modules
+
+
+def legacy_render_course_html(modules):
+    html_content = """
+    <html>
+    <head>
+        <meta charset='utf-8'>
+        <title>Course</title>
+        <style>
+            body { font-family: Arial; padding: 20px; background:#f5f7fa; }
+            h1 { text-align:center; }
+            .module { margin-bottom: 30px; }
+            .module h2 { color:#2c3e50; }
+
+            .card {
+                background: white;
+                border-radius: 10px;
+                padding: 15px;
+                margin: 10px 0;
+                box-shadow: 0 2px 6px rgba(0,0,0,0.1);
+            }
+
+            details summary {
+                font-weight: bold;
+                cursor: pointer;
+                font-size: 16px;
+            }
+
+            .content {
+                margin-top:10px;
+                line-height:1.6;
+                color:#333;
+            }
+        </style>
+    </head>
+    <body>
+        <h1>Course Content</h1>
+    """
+
+    for idx, mod in enumerate(modules, start=1):
+        html_content += f"""
+        <div class='module'>
+            <h2>Module {idx}: {html.escape(mod['title'])}</h2>
+        """
+
+        for page in mod["pages"]:
+            formatted = html.escape(page["content"])
+
+            formatted = formatted.replace("Explanation:", "<br><b>Explanation:</b>")
+            formatted = formatted.replace("Syntax:", "<br><b>Syntax:</b>")
+            formatted = formatted.replace("Example:", "<br><b>Example:</b>")
+            formatted = formatted.replace("Subtopics:", "<br><b>Subtopics:</b>")
+            formatted = formatted.replace("Subtopic Explanation:", "<br><b>Subtopic Explanation:</b>")
+
+            formatted = formatted.replace("\n", "<br>")
+
+            # Skip collapse for module title
+            if page['title'].lower().startswith("module"):
+                html_content += f"""
+                <div class='card'>
+                    <div style="font-weight:bold; font-size:16px;">
+                        {html.escape(page['title'])}
+                    </div>
+                </div>
+                """
+            else:
+                html_content += f"""
+                <div class='card'>
+                    <details>
+                        <summary>▶ {html.escape(page['title'])}</summary>
+                        <div class='content'>{formatted}</div>
+                    </details>
+                </div>
+    """
+
+        html_content += "</div>"
+
+    html_content += "</body></html>"
+    return html_content
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark course/assessment HTML rendering.")
+    parser.add_argument("--modules", type=_int_list, default=[10, 50, 100], help="comma-separated module counts")
+    parser.add_argument("--questions", type=int, default=30, help="questions in the assessment page")
+    parser.add_argument("--repeat", type=int, default=5, help="timing rounds (best is reported)")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    # cold renders only: no fragments from disk either
+    os.environ["SCORM_BUILD_CACHE_ENABLED"] = "false"
+    import scorm_exporter
+    from bench_scorm_size import fake_outline
+    from course_ast import parse_outline
+
+    def legacy(text):
+        return legacy_render_course_html(legacy_parse_course_content(text))
+
+    def current(text):
+        # cold: clear the per-module fragment cache so every module is rendered
+        scorm_exporter._fragments.clear()
+        return scorm_exporter._render_course_html(parse_outline(text))
+
+    print(f"{'modules':>7} {'KB':>7} {'legacy ms':>10} {'current ms':>11} {'speedup':>8}")
+    for modules in args.modules:
+        text = fake_outline(modules)
+        rendered = current(text)
+        if rendered != legacy(text):
+            raise SystemExit(f"[ERROR] Rendered course differs from the legacy renderer ({modules} modules)")
+        number = max(1, 200 // modules)
+        legacy_s = min(timeit.repeat(lambda: legacy(text), number=number, repeat=args.repeat)) / number
+        current_s = min(timeit.repeat(lambda: current(text), number=number, repeat=args.repeat)) / number
+        print(f"{modules:>7} {len(rendered) / 1024:>7.0f} {legacy_s * 1000:>10.2f} {current_s * 1000:>11.2f} "
+              f"{legacy_s / current_s:>7.1f}x")
+
+    # questions are rendered in the browser from the embedded BANK, so check its payload
+    questions = scorm_exporter._fallback_questions("Benchmark", "mcq") * (args.questions // 5 or 1)
+    page = scorm_exporter._render_assessment_html("bench", questions, 2, "bench")
+    match = re.search(r"^const BANK = (.*);$", page, re.MULTILINE)
+    expected = [{k: q[k] for k in ("q", "type", "options", "answer_index", "answer") if k in q} for q in questions]
+    if match is None or json.loads(match.group(1)) != expected:
+        raise SystemExit("[ERROR] Assessment BANK does not match the questions")
+    print(f"[INFO] Assessment embeds all {len(questions)} questions in its BANK")
+
+
+if __name__ == "__main__":
+    main()
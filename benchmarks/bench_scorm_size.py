@@ -0,0 +1,81 @@
+# benchmarks/bench_scorm_size.py
+"""
+Size/time tradeoff of SCORM package compression and HTML minification.
+
+    python benchmarks/bench_scorm_size.py --modules 5,20,50
+
+Renders a deterministic fake outline once per module count, then packages it
+with every compression method/level, with and without minification.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COMBINATIONS = [
+    ("stored", None), ("deflate", 1), ("deflate", 6), ("deflate", 9),
+    ("bzip2", 9), ("lzma", None),
+]
+
+
+def fake_outline(modules: int) -> str:
+    from content_pipeline import assemble_outline, build_module_prompt
+    from llm_backends import fake_completion_text
+
+    titles = [f"Benchmark Module {i}" for i in range(1, modules + 1)]
+    results = {
+        idx: fake_completion_text([{"role": "user", "content": build_module_prompt(title, "Formal")}])
+        for idx, title in enumerate(titles, start=1)
+    }
+    return assemble_outline(titles, results)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare SCORM package compression settings.")
+    parser.add_argument("--modules", type=_int_list, default=[5, 20, 50], help="comma-separated module counts")
+    parser.add_argument("--repeat", type=int, default=5, help="packaging runs per setting (best time is reported)")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    import scorm_exporter
+
+    # questions come from the deterministic fallback; this measures packaging only
+    scorm_exporter.call_gpt = None
+
+    rows: List[Dict[str, Any]] = []
+    for modules in args.modules:
+        files = scorm_exporter.render_scorm_files(fake_outline(modules), "benchmark", "MCQ", 2, "bench")
+        for compression, level in COMBINATIONS:
+            for minify in (False, True):
+                runs = [scorm_exporter.package_scorm_files(files, compression, level, minify)[1]
+                        for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r["minify_ms"] + r["zip_ms"])
+                rows.append(dict(best, modules=modules))
+
+    header = f"{'modules':>7} {'method':>8} {'level':>5} {'minify':>6} {'raw KB':>8} {'zip KB':>8} " \
+             f"{'ratio':>6} {'minify ms':>9} {'zip ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['modules']:>7} {r['compression']:>8} {str(r['level'] or '-'):>5} {str(r['minify']):>6} "
+              f"{r['raw_bytes'] / 1024:>8.1f} {r['zip_bytes'] / 1024:>8.1f} {r['ratio']:>6.3f} "
+              f"{r['minify_ms']:>9.2f} {r['zip_ms']:>8.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"[INFO] Report written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# blob_catalog.py
+"""
+In-process catalog of the SCORM zips in the blob container, so the
+/final_courses endpoints don't scan the container on every request.
+
+The blob listing is the source of truth: the catalog is reloaded from it in
+a background thread every BLOB_CATALOG_REFRESH_SECONDS, and a read finding
+it older than BLOB_CATALOG_TTL reloads it first. Our own uploads are added
+as soon as they finish (see azure_blob_utils.add_upload_listener), so a new
+package is listed without waiting for the next refresh.
+
+Names are kept sorted, so a prefix lookup is a bisect plus the matches.
+Substring search runs str.find over one lowercased string of all names
+(rebuilt lazily after uploads) and maps hits back to names by offset, so it
+costs a C-speed pass over memory plus O(matches), not a container scan.
+Set BLOB_CATALOG_PATH to keep a snapshot on disk for warm restarts.
+"""
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from azure_blob_utils import add_upload_listener, get_container_client
+from metrics import REGISTRY
+
+BLOB_CATALOG_TTL = float(os.getenv("BLOB_CATALOG_TTL", "300"))
+BLOB_CATALOG_REFRESH_SECONDS = float(os.getenv("BLOB_CATALOG_REFRESH_SECONDS", "60"))
+BLOB_CATALOG_PATH = os.getenv("BLOB_CATALOG_PATH", "")
+# Page size for listings that stream straight from storage (the service caps it at 5000)
+BLOB_LIST_PAGE_SIZE = int(os.getenv("BLOB_LIST_PAGE_SIZE", "500"))
+
+
+@dataclass(slots=True)
+class CatalogEntry:
+    name: str
+    size: Optional[int] = None
+    # ISO 8601, UTC
+    last_modified: Optional[str] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def course_name(self) -> str:
+        return os.path.splitext(os.path.basename(self.name))[0]
+
+
+def _entry(blob) -> CatalogEntry:
+    modified = blob.last_modified.isoformat() if blob.last_modified else None
+    return CatalogEntry(blob.name, blob.size, modified, dict(blob.metadata or {}))
+
+
+def list_scorm_blobs() -> List[CatalogEntry]:
+    """Every .zip in the container with its properties and metadata (a full scan)."""
+    return [_entry(blob) for blob in get_container_client().list_blobs(include=["metadata"])
+            if blob.name.endswith(".zip")]
+
+
+def iter_scorm_pages(prefix: str = "", page_size: int = BLOB_LIST_PAGE_SIZE,
+                     continuation_token: Optional[str] = None) -> Iterator[Tuple[List[CatalogEntry], Optional[str]]]:
+    """
+    One storage listing page at a time, starting at `continuation_token`:
+    yields (the page's .zip entries, token for the next page or None at the end).
+    `prefix` is pushed down as name_starts_with. Pages hold at most
+    `page_size` blobs, fewer .zips when other files share the prefix.
+    """
+    pages = get_container_client().list_blobs(
+        name_starts_with=prefix or None, include=["metadata"], results_per_page=page_size,
+    ).by_page(continuation_token=continuation_token)
+    for page in pages:
+        entries = [_entry(blob) for blob in page if blob.name.endswith(".zip")]
+        yield entries, pages.continuation_token or None
+
+
+class BlobCatalog:
+    def __init__(self, lister: Callable[[], List[CatalogEntry]] = list_scorm_blobs,
+                 ttl: float = BLOB_CATALOG_TTL, path: str = BLOB_CATALOG_PATH):
+        self.ttl = ttl
+        self.path = path
+        self._lister = lister
+        self._lock = threading.Lock()
+        # one listing at a time; concurrent readers wait for it instead of scanning too
+        self._refresh_lock = threading.Lock()
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._names: List[str] = []
+        # "\n".join of the lowercased names and where each one starts; None when stale
+        self._text: Optional[str] = None
+        self._offsets: List[int] = []
+        self._loaded_at = 0.0
+        # our uploads since the current listing started, which it may not include
+        self._recent: Dict[str, Tuple[float, CatalogEntry]] = {}
+        self._stats = {"refreshes": 0, "refresh_errors": 0, "uploads": 0, "lookups": 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if path:
+            self._load_snapshot()
+
+    # ---------------- maintenance ----------------
+
+    @staticmethod
+    def _add(entries: Dict[str, CatalogEntry], names: List[str], entry: CatalogEntry) -> None:
+        if entry.name not in entries:
+            bisect.insort(names, entry.name)
+        entries[entry.name] = entry
+
+    def record_upload(self, blob_name: str, size: Optional[int]) -> None:
+        """Upload listener: add or update a .zip we just wrote."""
+        if not blob_name.endswith(".zip"):
+            return
+        now = time.time()
+        entry = CatalogEntry(blob_name, size, datetime.fromtimestamp(now, timezone.utc).isoformat())
+        with self._lock:
+            if blob_name not in self._entries:
+                self._text = None
+            self._add(self._entries, self._names, entry)
+            self._recent[blob_name] = (now, entry)
+            self._stats["uploads"] += 1
+
+    def refresh(self, max_age: Optional[float] = None) -> bool:
+        """
+        Reload from the blob listing (unless it is already younger than `max_age`).
+        Returns False, keeping the old entries, if the listing fails.
+        """
+        with self._refresh_lock:
+            started = time.time()
+            if max_age is not None and started - self._loaded_at <= max_age:
+                # another caller refreshed while we waited for the lock
+                return True
+            try:
+                listed = self._lister()
+            except Exception as e:
+                print(f"[WARN] Blob catalog refresh failed: {e}")
+                with self._lock:
+                    self._stats["refresh_errors"] += 1
+                return False
+
+            entries = {entry.name: entry for entry in listed}
+            names = sorted(entries)
+
+            with self._lock:
+                self._recent = {name: item for name, item in self._recent.items() if item[0] >= started}
+                for _, entry in self._recent.values():
+                    if entry.name not in entries:
+                        self._add(entries, names, entry)
+                self._entries, self._names, self._text = entries, names, None
+                self._loaded_at = started
+                self._stats["refreshes"] += 1
+        if self.path:
+            self._save_snapshot()
+        return True
+
+    def _ensure_fresh(self) -> None:
+        if time.time() - self._loaded_at > self.ttl:
+            self.refresh(max_age=self.ttl)
+
+    def start(self, interval: float = BLOB_CATALOG_REFRESH_SECONDS) -> None:
+        """Refresh in a daemon thread every `interval` seconds (0 disables it)."""
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+
+        def _run() -> None:
+            self._ensure_fresh()
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._thread = threading.Thread(target=_run, name="blob-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    # ---------------- lookups ----------------
+
+    def list(self, prefix: str = "") -> List[CatalogEntry]:
+        """Entries whose name starts with `prefix`, sorted by name."""
+        self._ensure_fresh()
+        with self._lock:
+            self._stats["lookups"] += 1
+            names = self._names
+            result = []
+            for i in range(bisect.bisect_left(names, prefix), len(names)):
+                if not names[i].startswith(prefix):
+                    break
+                result.append(self._entries[names[i]])
+            return result
+
+    def search(self, query: str) -> List[CatalogEntry]:
+        """Entries whose name contains `query` (case-insensitive), sorted by name."""
+        self._ensure_fresh()
+        query = query.lower()
+        if not query or "\n" in query:
+            return self.list() if not query else []
+        with self._lock:
+            self._stats["lookups"] += 1
+            if self._text is None:
+                lowered = [name.lower() for name in self._names]
+                self._text = "\n".join(lowered)
+                self._offsets = list(itertools.accumulate((len(n) + 1 for n in lowered[:-1]), initial=0))
+            text, offsets, names = self._text, self._offsets, self._names
+            result = []
+            pos = text.find(query)
+            while pos != -1:
+                i = bisect.bisect_right(offsets, pos) - 1
+                result.append(self._entries[names[i]])
+                # continue after this name: one hit per name
+                pos = text.find(query, offsets[i + 1] if i + 1 < len(offsets) else len(text))
+            return result
+
+    def get(self, blob_name: str) -> Optional[CatalogEntry]:
+        self._ensure_fresh()
+        with self._lock:
+            return self._entries.get(blob_name)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries),
+                        age_seconds=round(time.time() - self._loaded_at, 3) if self._loaded_at else -1)
+
+    # ---------------- snapshot ----------------
+
+    def _save_snapshot(self) -> None:
+        with self._lock:
+            # plain dicts: dataclasses.asdict deep-copies and is ~10x slower here
+            data = {"loaded_at": self._loaded_at,
+                    "entries": [{"name": e.name, "size": e.size, "last_modified": e.last_modified,
+                                 "metadata": e.metadata} for e in self._entries.values()]}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Could not save blob catalog to {self.path}: {e}")
+
+    def _load_snapshot(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            entries = [CatalogEntry(**e) for e in data["entries"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        with self._lock:
+            for entry in entries:
+                self._add(self._entries, self._names, entry)
+            # keeps its age, so a stale snapshot is refreshed on first use
+            self._loaded_at = float(data.get("loaded_at", 0))
+
+
+catalog = BlobCatalog()
+add_upload_listener(catalog.record_upload)
+
+REGISTRY.callback(
+    "blob_catalog", "SCORM blob catalog (entries, age, refreshes, lookups, ...)", "gauge",
+    lambda: [({"stat": k}, v) for k, v in catalog.stats().items()])
@@ -0,0 +1,119 @@
+# blob_storage.py
+"""
+Async blob uploads (azure.storage.blob.aio) for the content pipeline and the
+update endpoint.
+
+`upload_blobs` uploads a run's artifacts concurrently, so the run waits for
+the largest blob rather than the sum of all of them. Each item can be bytes,
+a readable stream or a local file path. Large blobs are split into
+BLOB_MAX_BLOCK_SIZE blocks sent BLOB_UPLOAD_MAX_CONCURRENCY at a time.
+Bytes and files the blob already holds are not sent again, as in
+azure_blob_utils.put_blob; UploadResult.transferred says which happened.
+
+The aio client and its aiohttp session belong to the event loop that created
+them, so one client is kept per loop; call close_blob_storage() on that loop
+at shutdown.
+"""
+import asyncio
+import time
+import weakref
+from typing import Iterable, List, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from azure_blob_utils import (
+    AZURE_BLOB_CONTAINER,
+    AZURE_CONNECTION_STRING,
+    BLOB_MAX_BLOCK_SIZE,
+    BLOB_MAX_SINGLE_PUT_SIZE,
+    BLOB_SKIP_UNCHANGED,
+    CONDITION_FAILED,
+    BlobData,
+    UploadPlan,
+    UploadResult,
+    content_md5,
+    describe_upload,
+    get_container_client,
+    uploaded,
+)
+from metrics import REGISTRY
+
+# hash bigger payloads off the event loop
+_HASH_IN_THREAD_BYTES = 1024 * 1024
+
+BLOB_UPLOAD_SECONDS = REGISTRY.histogram(
+    "blob_upload_duration_seconds", "Wall time of single blob uploads", ("kind",))
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+
+async def _get_container_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        # the sync client creates the container if needed and signs the SAS URLs
+        await asyncio.to_thread(get_container_client)
+    clients = _clients.get(loop)
+    if clients is None:
+        from azure.storage.blob.aio import BlobServiceClient
+
+        service_client = BlobServiceClient.from_connection_string(
+            AZURE_CONNECTION_STRING,
+            max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE,
+            max_block_size=BLOB_MAX_BLOCK_SIZE,
+        )
+        clients = _clients[loop] = (service_client, service_client.get_container_client(AZURE_BLOB_CONTAINER))
+    return clients[1]
+
+
+async def close_blob_storage() -> None:
+    """Close the current loop's client (and its connection pool)."""
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients is not None:
+        # the service client owns the transport the container client uses
+        await clients[0].close()
+
+
+async def upload_blob(data: BlobData, blob_name: str) -> UploadResult:
+    """
+    Upload bytes, a readable stream or a local file (path) unless the blob
+    already holds the same bytes; the result carries the SAS URL, like
+    azure_blob_utils.upload_file_to_blob, and whether anything was sent.
+    """
+    kind, size = describe_upload(data)
+    started = time.perf_counter()
+    blob_client = (await _get_container_client()).get_blob_client(blob_name)
+    print(f"[UPLOAD] {data if kind == 'path' else f'{size if size is not None else kind} bytes'} -> {blob_name}")
+
+    async def put(**kwargs) -> str:
+        if kind == "path":
+            with open(data, "rb") as f:
+                return (await blob_client.upload_blob(f, **kwargs))["etag"]
+        return (await blob_client.upload_blob(data, **kwargs))["etag"]
+
+    def done(**kwargs) -> UploadResult:
+        BLOB_UPLOAD_SECONDS.observe(time.perf_counter() - started, kind=kind)
+        return uploaded(blob_name, size, **kwargs)
+
+    async def props():
+        try:
+            return await blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+
+    md5 = None
+    if kind != "stream" and BLOB_SKIP_UNCHANGED:
+        md5 = await asyncio.to_thread(content_md5, data) if kind == "path" or size > _HASH_IN_THREAD_BYTES \
+            else content_md5(data)
+    plan = UploadPlan(blob_name, md5, size)
+    while True:
+        if plan.needs_props and plan.is_current(await props()):
+            return done(transferred=False, md5=md5, etag=plan.etag)
+        try:
+            return done(md5=md5, etag=await put(**plan.put_kwargs()))
+        except CONDITION_FAILED as e:
+            plan.conflict(e)
+
+
+async def upload_blobs(items: Iterable[Tuple[BlobData, str]]) -> List[UploadResult]:
+    """Upload (data, blob_name) pairs concurrently; results in the same order. Raises the first failure."""
+    return list(await asyncio.gather(*(upload_blob(data, blob_name) for data, blob_name in items)))
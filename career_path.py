@@ -1,27 +1,9 @@
 
 from pydantic import BaseModel
 from typing import List
-from openai import AzureOpenAI
-from dotenv import load_dotenv
-import os
+from gpt_engine import call_gpt_async
 import json
  
-# Load env vars
-load_dotenv()
- 
-## Azure OpenAI credentials
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
- 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=AZURE_OPENAI_API_KEY,
-    api_version=AZURE_OPENAI_API_VERSION,
-    azure_endpoint=AZURE_OPENAI_ENDPOINT,
-)
- 
 # Input schema
 class CareerPathRequest(BaseModel):
     current_role: str
@@ -44,7 +26,7 @@ class CareerPathResponse(BaseModel):
     courses: List[Course]
  
  
-def generate_career_path_logic(request: CareerPathRequest) -> CareerPathResponse:
+async def generate_career_path_logic(request: CareerPathRequest) -> CareerPathResponse:
     """
     Generate a simplified career path course list using GPT-4o.
     """
@@ -73,17 +55,18 @@ def generate_career_path_logic(request: CareerPathRequest) -> CareerPathResponse
     Estimated weekly hours: {request.estimated_weekly_hours}
     """
  
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT_NAME,
+    content = await call_gpt_async(
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
         temperature=0.4,
         max_tokens=600,
-        response_format={"type": "json_object"}  # ✅ Force JSON
+        response_format={"type": "json_object"},  # ✅ Force JSON
+        # a reply that fails to parse must not be replayed from the cache
+        use_cache=False,
+        caller="career_path",
     )
  
-    content = response.choices[0].message.content
     data = json.loads(content)
     return CareerPathResponse(**data)
\ No newline at end of file
@@ -1,6 +1,5 @@
 import os
 from sqlalchemy import create_engine, text
-from openai import AzureOpenAI
 from dotenv import load_dotenv
 from sqlalchemy import Column, String, Date
 from sqlalchemy.ext.declarative import declarative_base
@@ -9,15 +8,6 @@ from sqlalchemy.orm import sessionmaker
 
 load_dotenv()
  
-# --------------------------
-# Azure GPT client (future use if LLM needed)
-# --------------------------
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
- 
 # --------------------------
 # DB Engine for reports
 # --------------------------
@@ -0,0 +1,432 @@
+# content_pipeline.py
+"""
+Syllabus -> detailed content -> SCORM -> blob pipeline.
+
+Shared by the blocking endpoint, the SSE streaming endpoint and background
+workers. Progress is reported through an optional `on_event(event, data)`
+callback.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from gpt_engine import call_gpt_async, stream_gpt_async
+from course_ast import load_course_ast, module_hashes, outline_hash, parse_outline
+from scorm_cache import SCORM_BUILD_CACHE_ENABLED
+from scorm_exporter import (build_scorm_package, chunk_questions, get_question_bank, question_chunks,
+                            questions_per_chunk, scorm_build_key)
+from blob_storage import upload_blob
+from metrics import REGISTRY
+
+GENERATED_DIR = "generated_syllabus"
+DETAILED_DIR = "detailed_courses"
+CONTENT_GENERATION_CONCURRENCY = int(os.getenv("CONTENT_GENERATION_CONCURRENCY", "5"))
+
+MODULE_SEPARATOR = "\n\n--------------------------------------------\n\n"
+
+# Bump when build_module_prompt changes so old checkpoints are not reused
+MODULE_PROMPT_VERSION = "1"
+CHECKPOINT_DIRNAME = "checkpoints"
+
+EventCallback = Callable[[str, Dict[str, Any]], None]
+
+PIPELINE_STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Wall time of content pipeline stages", ("stage",))
+
+
+@contextmanager
+def _timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PIPELINE_STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+@dataclass
+class CourseRequest:
+    syllabus_name: str
+    syllabus: str
+    meta_path: str
+    meta: Dict[str, Any] = field(default_factory=dict)
+    module_titles: List[str] = field(default_factory=list)
+    ai_tone: Optional[str] = "Formal"
+    assessment_type: Optional[str] = None
+    attempts: Optional[int] = None
+    # publish even if some modules failed after retries (they are left out of the outline)
+    allow_partial: bool = False
+
+
+def _emit(on_event: Optional[EventCallback], event: str, **data: Any) -> None:
+    if on_event is not None:
+        on_event(event, data)
+
+
+def build_module_prompt(module_title: str, ai_tone: str) -> str:
+    return f"""
+You are an expert instructional designer.
+
+Generate detailed content ONLY for this module:
+
+Module: {module_title}
+
+STRUCTURE:
+
+1. Introduction:
+(150–200 words)
+
+2. Explanation:
+(300–500 words)
+
+3. Subtopics:
+- Minimum 5 and maximum 6 subtopics
+
+4. Subtopic Explanation:
+
+For EACH subtopic include:
+- Explanation (100–150 words)
+- Syntax (if applicable)
+- Example (code or real-world)
+
+STRICT RULES:
+- Do NOT generate other modules
+- Do NOT stop early
+- Do NOT use markdown (#, *, etc.)
+- Use plain text only
+- Keep it beginner-friendly and practical
+
+Tone: {ai_tone}
+""".strip()
+
+
+def _checkpoint_dir(syllabus_name: str) -> str:
+    return os.path.join(DETAILED_DIR, syllabus_name, CHECKPOINT_DIRNAME)
+
+
+def _checkpoint_path(syllabus_name: str, module_title: str, ai_tone: Optional[str]) -> str:
+    digest = hashlib.sha256(
+        f"{MODULE_PROMPT_VERSION}\n{module_title}\n{ai_tone}".encode("utf-8")
+    ).hexdigest()[:24]
+    return os.path.join(_checkpoint_dir(syllabus_name), f"{digest}.txt")
+
+
+def _read_checkpoint(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoints(syllabus_name: str) -> None:
+    shutil.rmtree(_checkpoint_dir(syllabus_name), ignore_errors=True)
+
+
+def current_package(syllabus_name: str, meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Blob, course_id and build key of the newest package recorded in meta.json."""
+    versions = meta.get("versions") or []
+    if versions:
+        latest = versions[-1]
+        if not latest.get("build_key"):
+            return None
+        return {"blob": f"{syllabus_name}/{latest['scorm_file']}", "course_id": latest["course_id"],
+                "build_key": latest["build_key"]}
+    if meta.get("build_key") and meta.get("course_id"):
+        return {"blob": f"{syllabus_name}.zip", "course_id": meta["course_id"], "build_key": meta["build_key"]}
+    return None
+
+
+def store_question_bank(meta: Dict[str, Any], course_text: str, assessment_type: Optional[str]) -> None:
+    """Record the outline's question bank in meta so rebuilds elsewhere need no LLM calls."""
+    questions = get_question_bank(course_text, assessment_type) if assessment_type else None
+    if questions:
+        meta["question_bank"] = {"outline_hash": outline_hash(course_text), "assessment_type": assessment_type,
+                                 "questions": questions}
+
+
+def meta_question_bank(meta: Dict[str, Any], course_text: str, assessment_type: Optional[str]) -> Optional[list]:
+    """The bank stored by store_question_bank, if it still matches the outline and assessment type."""
+    bank = (meta or {}).get("question_bank") or {}
+    if bank.get("outline_hash") == outline_hash(course_text) and bank.get("assessment_type") == assessment_type:
+        return bank.get("questions") or None
+    return None
+
+
+def load_course_request(syllabus_name: str, allow_partial: bool = False) -> CourseRequest:
+    """Read syllabus.txt + meta.json and extract module titles (raises 404/400)."""
+    syllabus_path = os.path.join(GENERATED_DIR, syllabus_name, "syllabus.txt")
+    meta_path = os.path.join(GENERATED_DIR, syllabus_name, "meta.json")
+
+    if not os.path.exists(syllabus_path):
+        raise HTTPException(status_code=404, detail="Syllabus not found.")
+
+    with open(syllabus_path, "r", encoding="utf-8") as f:
+        syllabus = f.read()
+
+    request = CourseRequest(syllabus_name=syllabus_name, syllabus=syllabus, meta_path=meta_path,
+                            allow_partial=allow_partial)
+
+    # Read meta (tone + assessment config)
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as m:
+                request.meta = json.load(m)
+                request.ai_tone = request.meta.get("ai_tone", "Formal")
+                request.assessment_type = request.meta.get("assessment_type")
+                request.attempts = request.meta.get("attempts")
+        except Exception:
+            pass
+
+    request.module_titles = re.findall(r"Module\s+\d+:\s*(.*)", syllabus)
+    if not request.module_titles:
+        raise HTTPException(status_code=400, detail="No modules found in syllabus.")
+
+    return request
+
+
+async def _generate_modules(syllabus_name: str, module_titles: List[str], ai_tone: str,
+                            on_event: Optional[EventCallback] = None, stream: bool = False,
+                            on_module_done: Optional[Callable[[int, str, Optional[str]], None]] = None):
+    """
+    Generate every module concurrently, at most CONTENT_GENERATION_CONCURRENCY at a time.
+    Each finished module is checkpointed, so a retry only generates the missing ones.
+    Returns ({module_index: content}, failed_modules, resumed_modules) so one
+    failed module does not discard the others. `on_module_done` is called as each
+    module finishes, with content=None when it failed.
+    """
+    semaphore = asyncio.Semaphore(max(1, CONTENT_GENERATION_CONCURRENCY))
+    resumed_modules = []
+
+    async def _generate(idx: int, module_title: str) -> str:
+        checkpoint = _checkpoint_path(syllabus_name, module_title, ai_tone)
+        content = await asyncio.to_thread(_read_checkpoint, checkpoint)
+        if content is not None:
+            print(f"[INFO] Module {idx} restored from checkpoint: {module_title}")
+            resumed_modules.append(idx)
+            if stream:
+                _emit(on_event, "token", module=idx, text=content)
+            _emit(on_event, "module_finished", module=idx, title=module_title, resumed=True)
+            return content
+
+        async with semaphore:
+            print(f"[INFO] Generating Module {idx}: {module_title}")
+            _emit(on_event, "module_started", module=idx, title=module_title)
+            prompt = build_module_prompt(module_title, ai_tone)
+            try:
+                if stream:
+                    parts = []
+                    async for delta in stream_gpt_async(prompt, caller="module"):
+                        parts.append(delta)
+                        _emit(on_event, "token", module=idx, text=delta)
+                    content = "".join(parts)
+                else:
+                    content = await call_gpt_async(prompt, caller="module")
+            except Exception as e:
+                _emit(on_event, "module_failed", module=idx, title=module_title, error=str(e))
+                raise
+            await asyncio.to_thread(_write_checkpoint, checkpoint, content)
+            _emit(on_event, "module_finished", module=idx, title=module_title, resumed=False)
+            return content
+
+    async def _run(idx: int, module_title: str) -> str:
+        try:
+            content = await _generate(idx, module_title)
+        except Exception:
+            if on_module_done is not None:
+                on_module_done(idx, module_title, None)
+            raise
+        if on_module_done is not None:
+            on_module_done(idx, module_title, content)
+        return content
+
+    outcomes = await asyncio.gather(
+        *(_run(idx, title) for idx, title in enumerate(module_titles, start=1)),
+        return_exceptions=True,
+    )
+
+    results: Dict[int, str] = {}
+    failed_modules = []
+    for idx, (module_title, outcome) in enumerate(zip(module_titles, outcomes), start=1):
+        if isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+        if isinstance(outcome, BaseException):
+            print(f"[ERROR] Module {idx} ({module_title}) failed: {outcome}")
+            failed_modules.append({"module": idx, "title": module_title, "error": str(outcome)})
+        else:
+            results[idx] = outcome
+    return results, failed_modules, sorted(resumed_modules)
+
+
+def _question_prefetcher(module_titles: List[str], assessment_type: Optional[str]):
+    """
+    Start generating each chunk's assessment questions (see
+    scorm_exporter.question_chunks) as soon as all of its modules are done,
+    instead of after the whole outline. The results land in the SCORM question
+    cache, where the build picks them up. A failed module is left out of the
+    outline (allow_partial), which moves the chunk boundaries, so the chunks
+    are laid over the modules still expected to make it in, exactly as the
+    build will split them. Returns (on_module_done, tasks).
+    """
+    tasks: List[asyncio.Task] = []
+    if not assessment_type or not SCORM_BUILD_CACHE_ENABLED:
+        return None, tasks
+
+    finished: Dict[int, Any] = {}
+    failed: Set[int] = set()
+    started: Set[Tuple[Tuple[int, ...], int]] = set()
+
+    def on_module_done(idx: int, module_title: str, content: Optional[str]) -> None:
+        if content is None:
+            failed.add(idx)
+        else:
+            # parsed exactly as the module's block in the assembled outline
+            finished[idx] = parse_outline(f"Module {idx}: {module_title}\n\n{content.strip()}").modules
+        expected = [i for i in range(1, len(module_titles) + 1) if i not in failed]
+        chunks = question_chunks(len(expected))
+        count = questions_per_chunk(len(chunks))
+        for chunk in chunks:
+            members = tuple(expected[pos] for pos in chunk)
+            if (members, count) in started or any(i not in finished for i in members):
+                continue
+            started.add((members, count))
+            modules = [m for i in members for m in finished[i]]
+            tasks.append(asyncio.create_task(asyncio.to_thread(chunk_questions, modules, assessment_type, count)))
+
+    return on_module_done, tasks
+
+
+async def _upload(data: Any, blob_name: str, on_event: Optional[EventCallback], with_url: bool = False) -> str:
+    result = await upload_blob(data, blob_name)
+    extra = {"scorm_url": result.url} if with_url else {}
+    _emit(on_event, "uploaded", blob=blob_name, transferred=result.transferred, **extra)
+    return result.url
+
+
+def assemble_outline(module_titles: List[str], results: Dict[int, str]) -> str:
+    detailed_content = ""
+    for idx, module_title in enumerate(module_titles, start=1):
+        if idx not in results:
+            continue
+        detailed_content += f"{MODULE_SEPARATOR}Module {idx}: {module_title}\n\n"
+        detailed_content += results[idx].strip()
+    return detailed_content
+
+
+async def generate_course_content(request: CourseRequest, on_event: Optional[EventCallback] = None,
+                                  stream: bool = False) -> Dict[str, Any]:
+    """Run the full pipeline for a loaded syllabus and return the API response body."""
+    syllabus_name = request.syllabus_name
+    meta = request.meta
+
+    _emit(on_event, "started", course_name=syllabus_name, modules=len(request.module_titles))
+
+    # STEP 1: Generate all modules concurrently (bounded), assemble in module order.
+    # Questions for each chunk of modules are generated as soon as the chunk is complete.
+    on_module_done, question_tasks = _question_prefetcher(request.module_titles, request.assessment_type)
+    with _timed("modules"):
+        results, failed_modules, resumed_modules = await _generate_modules(
+            syllabus_name, request.module_titles, request.ai_tone, on_event=on_event, stream=stream,
+            on_module_done=on_module_done,
+        )
+    if not results:
+        raise HTTPException(status_code=502, detail="Content generation failed for all modules.")
+    if failed_modules and not request.allow_partial:
+        # Nothing is published; finished modules stay checkpointed, so a retry only redoes these
+        for task in question_tasks:
+            task.cancel()
+        raise HTTPException(status_code=502, detail={
+            "message": "Content generation failed for some modules; retry to resume, "
+                       "or pass allow_partial=true to publish without them.",
+            "failed_modules": failed_modules,
+            "resumed_modules": resumed_modules,
+        })
+
+    detailed_content = assemble_outline(request.module_titles, results)
+    build_key = scorm_build_key(detailed_content, syllabus_name, request.assessment_type, request.attempts)
+    # Rebuilding the same outline keeps its course_id, so the package and meta.json come out
+    # byte-identical (the upload skips them) and learners' saved progress stays attached
+    if meta.get("build_key") == build_key and meta.get("course_id"):
+        course_id = meta["course_id"]
+    else:
+        course_id = str(uuid.uuid4())
+    meta["course_id"] = course_id
+
+    # STEP 2: Save locally (outline.txt)
+    folder = os.path.join(DETAILED_DIR, syllabus_name)
+    os.makedirs(folder, exist_ok=True)
+
+    outline_path = os.path.join(folder, "outline.txt")
+    with open(outline_path, "w", encoding="utf-8") as f:
+        f.write(detailed_content)
+    # Parse once: writes outline.json and warms the memo the SCORM build reads from
+    course = await asyncio.to_thread(load_course_ast, folder, detailed_content)
+    # Checkpoints only matter until every module made it into the outline
+    if not failed_modules:
+        clear_checkpoints(syllabus_name)
+    _emit(on_event, "outline_saved", failed_modules=failed_modules, resumed_modules=resumed_modules)
+
+    # STEP 3: Upload outline to Azure, overlapping the SCORM build
+    outline_upload = asyncio.create_task(
+        _upload(outline_path, f"{syllabus_name}/outline.txt", on_event))
+
+    try:
+        # STEP 4: Generate SCORM (in memory, no temp files)
+        with _timed("scorm"):
+            # failed prefetches are simply retried by the build
+            await asyncio.gather(*question_tasks, return_exceptions=True)
+            package = await asyncio.to_thread(
+                build_scorm_package,
+                detailed_content,
+                course_name=syllabus_name,
+                assessment_type=request.assessment_type,
+                attempts=request.attempts,
+                course_id=course_id,
+            )
+        _emit(on_event, "scorm_built", course_id=course_id, size=len(package))
+
+        # STEP 5: Save updated meta.json
+        # build_key lets update_detailed_content recognise an unchanged outline later
+        meta["build_key"] = build_key
+        meta["module_hashes"] = module_hashes(course)
+        store_question_bank(meta, detailed_content, request.assessment_type)
+        with open(request.meta_path, "w", encoding="utf-8") as m:
+            json.dump(meta, m)
+    except BaseException:
+        outline_upload.cancel()
+        raise
+
+    # STEP 6: Upload meta.json and the SCORM package concurrently (and finish the outline)
+    blob_name = f"{syllabus_name}.zip"
+    with _timed("upload"):
+        _, _, scorm_url = await asyncio.gather(
+            outline_upload,
+            _upload(request.meta_path, f"{syllabus_name}/meta.json", on_event),
+            _upload(package, blob_name, on_event, with_url=True),
+        )
+
+    return {
+        "course_name": syllabus_name,
+        "outline": detailed_content,
+        "scorm_url": scorm_url,
+        "failed_modules": failed_modules,
+        "resumed_modules": resumed_modules,
+        "editable": True,
+    }
@@ -0,0 +1,256 @@
+# course_ast.py
+"""
+Typed course structure parsed from outline.txt: modules -> sections -> subtopics.
+
+`parse_outline` makes one left-to-right pass over the text with precompiled
+patterns and no intermediate splits of the whole outline. Results are
+memoized by outline hash (`parse_outline_cached`) so the SCORM renderers,
+question generation and anything else that needs the structure share one
+parse, and can be saved as outline.json next to outline.txt.
+
+Parsed courses are shared between callers: treat them as read-only.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Bump when the parser or the JSON layout changes so stale outline.json files are ignored
+COURSE_AST_VERSION = 2
+COURSE_AST_FILENAME = "outline.json"
+COURSE_AST_CACHE_SIZE = int(os.getenv("COURSE_AST_CACHE_SIZE", "64"))
+
+# Same boundaries the exporter has always used: a run of 10+ dashes ends a
+# module, "\n<n>. " starts a section, "Module <n>: <title>" names the module.
+# The separator is spelled with a literal prefix so the scan uses re's fast
+# substring search instead of trying the pattern at every position (~20x).
+_MODULE_SEPARATOR = re.compile(r"----------+\s*")
+_SECTION_START = re.compile(r"\n\d+\.\s")
+_MODULE_TITLE = re.compile(r"Module\s+\d+:\s*(.*)")
+_SUBTOPIC_FIELD = re.compile(r"(Explanation|Syntax|Example):\s*(.*)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+@dataclass(slots=True)
+class Subtopic:
+    title: str
+    explanation: str = ""
+    syntax: str = ""
+    example: str = ""
+
+
+@dataclass(slots=True)
+class Section:
+    title: str
+    content: str
+    subtopics: List[Subtopic] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class Module:
+    title: str
+    sections: List[Section] = field(default_factory=list)
+    # sha256 of the module's outline text, for per-module diffs and caches
+    source_hash: str = ""
+
+
+@dataclass(slots=True)
+class Course:
+    outline_hash: str
+    modules: List[Module] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), version=COURSE_AST_VERSION)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Course":
+        return cls(
+            outline_hash=data["outline_hash"],
+            modules=[
+                Module(
+                    title=m["title"],
+                    source_hash=m.get("source_hash", ""),
+                    sections=[
+                        Section(title=s["title"], content=s["content"],
+                                subtopics=[Subtopic(**t) for t in s.get("subtopics", [])])
+                        for s in m.get("sections", [])
+                    ],
+                )
+                for m in data.get("modules", [])
+            ],
+        )
+
+
+def outline_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _parse_subtopics(content: str) -> List[Subtopic]:
+    """
+    "Subtopic Explanation" bodies: a title line followed by Explanation:/
+    Syntax:/Example: lines. Other lines continue the previous field unless
+    they follow a blank line or a finished Example, which starts a new subtopic.
+    """
+    subtopics: List[Subtopic] = []
+    current: Optional[Subtopic] = None
+    last_field: Optional[str] = None
+    after_blank = True
+
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            after_blank = True
+            continue
+        m = _SUBTOPIC_FIELD.match(line)
+        if m and current is not None:
+            last_field = m.group(1).lower()
+            setattr(current, last_field, m.group(2).strip())
+        elif current is None or after_blank or last_field == "example" or last_field is None:
+            current = Subtopic(title=line)
+            subtopics.append(current)
+            last_field = None
+        else:
+            value = getattr(current, last_field)
+            setattr(current, last_field, f"{value}\n{line}" if value else line)
+        after_blank = False
+    return subtopics
+
+
+def _subtopic_titles(content: str) -> List[Subtopic]:
+    """A "Subtopics" list section: one title per non-empty line."""
+    return [Subtopic(title=_LIST_ITEM.sub("", line).strip())
+            for line in content.splitlines() if line.strip()]
+
+
+def _make_section(text: str, start: int, end: int) -> Optional[Section]:
+    body = text[start:end].strip()
+    if not body:
+        return None
+    title, _, content = body.partition("\n")
+    title, content = title.strip(), content.strip()
+
+    section = Section(title=title, content=content)
+    key = title.lower().rstrip(":").strip()
+    if key.startswith("subtopic explanation"):
+        section.subtopics = _parse_subtopics(content)
+    elif key == "subtopics":
+        section.subtopics = _subtopic_titles(content)
+    return section
+
+
+def _parse_module(text: str, start: int, end: int) -> Optional[Module]:
+    title_match = _MODULE_TITLE.search(text, start, end)
+    if not title_match:
+        return None
+    module = Module(title=title_match.group(1).strip(), source_hash=outline_hash(text[start:end]))
+
+    # The first line of the block is the title line; sections start after it
+    first_newline = text.find("\n", start, end)
+    if first_newline == -1:
+        return module
+    body_start = first_newline + 1
+
+    section_start = body_start
+    for m in _SECTION_START.finditer(text, body_start, end):
+        section = _make_section(text, section_start, m.start())
+        if section is not None:
+            module.sections.append(section)
+        section_start = m.end()
+    section = _make_section(text, section_start, end)
+    if section is not None:
+        module.sections.append(section)
+    return module
+
+
+def parse_outline(text: str) -> Course:
+    """Parse an outline in a single pass over `text` (no caching)."""
+    course = Course(outline_hash=outline_hash(text))
+    block_start = 0
+    for m in _MODULE_SEPARATOR.finditer(text):
+        module = _parse_module(text, block_start, m.start())
+        if module is not None:
+            course.modules.append(module)
+        block_start = m.end()
+    module = _parse_module(text, block_start, len(text))
+    if module is not None:
+        course.modules.append(module)
+    return course
+
+
+_cache: "OrderedDict[str, Course]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse_outline_cached(text: str) -> Course:
+    """parse_outline memoized by outline hash (bounded LRU, shared across threads)."""
+    key = outline_hash(text)
+    with _cache_lock:
+        course = _cache.get(key)
+        if course is not None:
+            _cache.move_to_end(key)
+            return course
+    course = parse_outline(text)
+    _remember(course)
+    return course
+
+
+def _remember(course: Course) -> None:
+    with _cache_lock:
+        _cache[course.outline_hash] = course
+        _cache.move_to_end(course.outline_hash)
+        while len(_cache) > COURSE_AST_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def diff_modules(old_hashes: List[str], course: Course) -> List[int]:
+    """1-based numbers of modules in `course` that are new or differ from `old_hashes` at the same position."""
+    return [idx for idx, module in enumerate(course.modules, start=1)
+            if idx > len(old_hashes) or old_hashes[idx - 1] != module.source_hash]
+
+
+def module_hashes(course: Course) -> List[str]:
+    return [module.source_hash for module in course.modules]
+
+
+def save_course_ast(course: Course, folder: str) -> str:
+    """Write outline.json into `folder` (atomically) and return its path."""
+    path = os.path.join(folder, COURSE_AST_FILENAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(course.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_course_ast(folder: str, text: str) -> Course:
+    """
+    The parsed course for `text`: from the memo, else from <folder>/outline.json
+    when it matches the outline hash and parser version, else parsed (and saved).
+    """
+    key = outline_hash(text)
+    with _cache_lock:
+        course = _cache.get(key)
+    if course is not None:
+        return course
+
+    path = os.path.join(folder, COURSE_AST_FILENAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == COURSE_AST_VERSION and data.get("outline_hash") == key:
+            course = Course.from_dict(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        course = None
+
+    if course is None:
+        course = parse_outline(text)
+        try:
+            save_course_ast(course, folder)
+        except OSError as e:
+            print(f"[WARN] Could not save {path}: {e}")
+    _remember(course)
+    return course
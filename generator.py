@@ -1,9 +1,9 @@
 # generator.py
 
-from gpt_engine import call_gpt
+from gpt_engine import call_gpt, call_gpt_async
 from typing import Dict, Any
 
-def generate_syllabus_prompt(data: Dict[str, Any]) -> str:
+def build_syllabus_prompt(data: Dict[str, Any]) -> str:
     """
     data contains keys:
       - topic (str)
@@ -74,5 +74,12 @@ Return structured module-wise syllabus:
 - Use plain text only
 """
 
-    # Trim and pass to GPT engine
-    return call_gpt(prompt.strip())
+    return prompt.strip()
+
+
+def generate_syllabus_prompt(data: Dict[str, Any]) -> str:
+    return call_gpt(build_syllabus_prompt(data), caller="syllabus")
+
+
+async def generate_syllabus_prompt_async(data: Dict[str, Any]) -> str:
+    return await call_gpt_async(build_syllabus_prompt(data), caller="syllabus")
@@ -1,19 +1,406 @@
+import asyncio
 import os
-from openai import AzureOpenAI
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
 from dotenv import load_dotenv
 
+from llm_backends import AzureOpenAIBackend, FakeLLMBackend
+from llm_cache import ResponseCache
+from llm_scheduler import LLMScheduler, estimate_tokens
+from metrics import REGISTRY
+
 load_dotenv()
 
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+AZURE_OPENAI_DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+
+# "azure" (default) or "fake" for offline runs and benchmarks
+LLM_BACKEND = os.getenv("LLM_BACKEND", "azure").lower()
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", "0.2"))
+LLM_FAKE_TOKENS_PER_SEC = float(os.getenv("LLM_FAKE_TOKENS_PER_SEC", "0"))
+
+# Shared client / connection pool tuning
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+# Rate limiting / retries (0 disables a bucket); match these to the deployment quota
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))
+# The buckets live in each process, so the quota is split between the processes that
+# share the deployment: API workers plus standalone job workers (`python jobs.py`)
+LLM_QUOTA_PROCESSES = max(1, int(os.getenv("LLM_QUOTA_PROCESSES", os.getenv("WEB_CONCURRENCY", "1"))))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+LLM_DEFAULT_COMPLETION_TOKENS = int(os.getenv("LLM_DEFAULT_COMPLETION_TOKENS", "1500"))
+# Ask for a final usage chunk on streamed calls, so the TPM bucket is corrected for
+# them too (needs api-version 2024-09-01 or later; set to false for older ones)
+LLM_STREAM_INCLUDE_USAGE = os.getenv("LLM_STREAM_INCLUDE_USAGE", "true").lower() == "true"
+
+# Response cache (memory LRU + on-disk SQLite)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+LLM_CACHE_MAX_DISK_MB = int(os.getenv("LLM_CACHE_MAX_DISK_MB", "256"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_cache: Optional[ResponseCache] = None
+if LLM_CACHE_ENABLED:
+    try:
+        _cache = ResponseCache(
+            LLM_CACHE_PATH,
+            memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+            max_disk_bytes=LLM_CACHE_MAX_DISK_MB * 1024 * 1024,
+            ttl_seconds=LLM_CACHE_TTL_SECONDS,
+        )
+    except Exception as e:
+        print(f"[WARN] LLM cache disabled: {e}")
+
+# The shared client and its httpx pool are bound to one event loop, so every
+# request runs on a dedicated engine loop. Async callers on other loops await
+# it through wrap_future; sync callers block on the returned future.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _make_backend():
+    if LLM_BACKEND == "fake":
+        print(f"[INFO] Using fake LLM backend (latency={LLM_FAKE_LATENCY}s, {LLM_FAKE_TOKENS_PER_SEC} tok/s)")
+        return FakeLLMBackend(latency=LLM_FAKE_LATENCY, tokens_per_second=LLM_FAKE_TOKENS_PER_SEC)
+    return AzureOpenAIBackend(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        timeout=LLM_TIMEOUT,
+        connect_timeout=LLM_CONNECT_TIMEOUT,
+    )
+
+
+_backend = _make_backend()
+# Lives on the engine loop like the client, so it sees every request in the process
+_scheduler = LLMScheduler(
+    rpm=LLM_RPM / LLM_QUOTA_PROCESSES,
+    tpm=LLM_TPM / LLM_QUOTA_PROCESSES,
+    max_retries=LLM_MAX_RETRIES,
+    base_delay=LLM_BACKOFF_BASE,
+    max_delay=LLM_BACKOFF_MAX,
 )
 
-def call_gpt(prompt: str) -> str:
-    response = client.chat.completions.create(
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
+# ------------------------------------------------------------
+# Telemetry (served by /metrics)
+# ------------------------------------------------------------
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "LLM calls by caller and outcome (ok, cache_hit, error)", ("caller", "outcome"))
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Wall time of LLM calls including queueing and retries", ("caller", "outcome"))
+LLM_TTFT = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time to first streamed token", ("caller",))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by response.usage", ("caller", "kind"))
+REGISTRY.callback(
+    "llm_scheduler", "Rate-limit scheduler state (queue_depth, in_flight, throttled, retries, ...)", "gauge",
+    lambda: [({"stat": k}, v) for k, v in _scheduler.stats().items()])
+REGISTRY.callback(
+    "llm_cache", "Response cache counters (memory_hits, disk_hits, misses, ...)", "gauge",
+    lambda: [({"stat": k}, v) for k, v in get_cache_stats().items()])
+
+
+def _observe(caller: str, outcome: str, started: float) -> None:
+    LLM_REQUESTS.inc(caller=caller, outcome=outcome)
+    LLM_LATENCY.observe(time.perf_counter() - started, caller=caller, outcome=outcome)
+
+
+def _record_usage(caller: str, usage: Any) -> None:
+    if usage is None:
+        return
+    LLM_TOKENS.inc(usage.prompt_tokens or 0, caller=caller, kind="prompt")
+    LLM_TOKENS.inc(usage.completion_tokens or 0, caller=caller, kind="completion")
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="gpt-engine", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def set_backend(backend: Any) -> None:
+    """Swap the completion backend (e.g. a FakeLLMBackend in benchmarks)."""
+    global _backend
+    _backend = backend
+
+
+def _build_messages(prompt: Optional[str], messages: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    if messages is not None:
+        return messages
+    if prompt is None:
+        raise ValueError("Either prompt or messages must be given")
+    return [{"role": "user", "content": prompt}]
+
+
+async def _complete(
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: Optional[int],
+    response_format: Optional[Dict[str, Any]],
+    caller: str,
+) -> str:
+    kwargs: Dict[str, Any] = {}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if response_format is not None:
+        kwargs["response_format"] = response_format
+
+    estimate = estimate_tokens(messages, max_tokens, LLM_DEFAULT_COMPLETION_TOKENS)
+    response = await _scheduler.run(
+        lambda: _backend.create(
+            model=AZURE_OPENAI_DEPLOYMENT_NAME,
+            messages=messages,
+            temperature=temperature,
+            **kwargs,
+        ),
+        estimate,
     )
+    if response.usage is not None:
+        _scheduler.record_usage(estimate, response.usage.total_tokens)
+        _record_usage(caller, response.usage)
     return response.choices[0].message.content
+
+
+def _cache_key(
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: Optional[int],
+    response_format: Optional[Dict[str, Any]],
+    use_cache: bool,
+) -> Optional[str]:
+    if not use_cache or _cache is None:
+        return None
+    return ResponseCache.make_key(
+        messages, AZURE_OPENAI_DEPLOYMENT_NAME, temperature,
+        max_tokens=max_tokens, response_format=response_format,
+    )
+
+
+def _cache_store(key: Optional[str], content: Optional[str]) -> None:
+    if key is not None and content:
+        _cache.set(key, content)
+
+
+async def _cache_get_async(key: Optional[str]) -> Optional[str]:
+    """Memory hit inline; the SQLite tier in a worker thread, off the caller's loop."""
+    if key is None:
+        return None
+    cached = _cache.peek(key)
+    if cached is None:
+        cached = await asyncio.to_thread(_cache.get, key)
+    return cached
+
+
+async def _cache_store_async(key: Optional[str], content: Optional[str]) -> None:
+    if key is not None and content:
+        await asyncio.to_thread(_cache.set, key, content)
+
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    """Queue depth, in-flight, throttle/retry counters of the rate-limit scheduler."""
+    return _scheduler.stats()
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Hit/miss/eviction counters of the response cache (empty if disabled)."""
+    return _cache.stats() if _cache is not None else {}
+
+
+def _on_engine_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+async def call_gpt_async(
+    prompt: Optional[str] = None,
+    *,
+    messages: Optional[List[Dict[str, Any]]] = None,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    use_cache: bool = True,
+    caller: str = "other",
+) -> str:
+    """
+    Run a chat completion on the shared, pooled client without blocking the caller's loop.
+    Pass either a single user `prompt` or a full `messages` list.
+    Identical requests are answered from the response cache unless use_cache=False.
+    `caller` tags the call in /metrics (syllabus, module, questions, career_path).
+    """
+    started = time.perf_counter()
+    messages = _build_messages(prompt, messages)
+    key = _cache_key(messages, temperature, max_tokens, response_format, use_cache)
+    cached = await _cache_get_async(key)
+    if cached is not None:
+        _observe(caller, "cache_hit", started)
+        return cached
+
+    coro = _complete(messages, temperature, max_tokens, response_format, caller)
+    loop = _get_loop()
+    try:
+        if _on_engine_loop():
+            content = await coro
+        else:
+            content = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+    except Exception:
+        _observe(caller, "error", started)
+        raise
+    _observe(caller, "ok", started)
+    await _cache_store_async(key, content)
+    return content
+
+
+def call_gpt(
+    prompt: Optional[str] = None,
+    *,
+    messages: Optional[List[Dict[str, Any]]] = None,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    use_cache: bool = True,
+    caller: str = "other",
+) -> str:
+    """
+    Blocking shim around the shared client for sync code paths
+    (threadpool endpoints, the SCORM exporter, scripts).
+    """
+    if _on_engine_loop():
+        raise RuntimeError("call_gpt() would deadlock on the engine loop; use call_gpt_async()")
+    started = time.perf_counter()
+    messages = _build_messages(prompt, messages)
+    key = _cache_key(messages, temperature, max_tokens, response_format, use_cache)
+    if key is not None:
+        cached = _cache.get(key)
+        if cached is not None:
+            _observe(caller, "cache_hit", started)
+            return cached
+
+    try:
+        content = asyncio.run_coroutine_threadsafe(
+            _complete(messages, temperature, max_tokens, response_format, caller), _get_loop()
+        ).result()
+    except Exception:
+        _observe(caller, "error", started)
+        raise
+    _observe(caller, "ok", started)
+    _cache_store(key, content)
+    return content
+
+
+async def stream_gpt_async(
+    prompt: Optional[str] = None,
+    *,
+    messages: Optional[List[Dict[str, Any]]] = None,
+    temperature: float = 0.7,
+    max_tokens: Optional[int] = None,
+    use_cache: bool = True,
+    caller: str = "other",
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion as text deltas. A cached response is yielded as a
+    single delta; a fully streamed response is stored in the cache.
+    Stopping iteration early cancels the underlying request.
+    """
+    started = time.perf_counter()
+    messages = _build_messages(prompt, messages)
+    key = _cache_key(messages, temperature, max_tokens, None, use_cache)
+    cached = await _cache_get_async(key)
+    if cached is not None:
+        _observe(caller, "cache_hit", started)
+        yield cached
+        return
+
+    caller_loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def _put(item: Any) -> None:
+        caller_loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    async def _pump() -> None:
+        kwargs: Dict[str, Any] = {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if LLM_STREAM_INCLUDE_USAGE:
+            kwargs["stream_options"] = {"include_usage": True}
+        estimate = estimate_tokens(messages, max_tokens, LLM_DEFAULT_COMPLETION_TOKENS)
+        try:
+            # throttling surfaces when the stream is opened, so only that step is retried
+            response = await _scheduler.run(
+                lambda: _backend.create(
+                    model=AZURE_OPENAI_DEPLOYMENT_NAME,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    **kwargs,
+                ),
+                estimate,
+            )
+            async for chunk in response:
+                # Azure sends content-filter chunks without choices
+                if chunk.choices and chunk.choices[0].delta.content:
+                    _put(chunk.choices[0].delta.content)
+                # the final chunk (with include_usage) carries the real total
+                if getattr(chunk, "usage", None) is not None:
+                    _scheduler.record_usage(estimate, chunk.usage.total_tokens)
+                    _record_usage(caller, chunk.usage)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _put(e)
+            return
+        _put(done)
+
+    if _on_engine_loop():
+        pump = asyncio.ensure_future(_pump())
+    else:
+        pump = asyncio.run_coroutine_threadsafe(_pump(), _get_loop())
+
+    parts: List[str] = []
+    finished = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                finished = True
+                break
+            if isinstance(item, BaseException):
+                finished = True
+                _observe(caller, "error", started)
+                raise item
+            if not parts:
+                LLM_TTFT.observe(time.perf_counter() - started, caller=caller)
+            parts.append(item)
+            yield item
+    finally:
+        if not finished:
+            pump.cancel()
+
+    _observe(caller, "ok", started)
+    await _cache_store_async(key, "".join(parts))
+
+
+def shutdown_engine() -> None:
+    """Close the shared client's connection pool (called on app shutdown)."""
+    if _loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_backend.close(), _loop).result(timeout=10)
+    except Exception as e:
+        print(f"[WARN] Failed to close LLM client cleanly: {e}")
@@ -0,0 +1,301 @@
+# jobs.py
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from content_pipeline import load_course_request, generate_course_content
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(".cache", "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class JobStore:
+    """
+    SQLite-backed job queue shared by every process on the instance.
+
+    A worker claims a job by taking a lease and renews it while the job runs.
+    Jobs whose lease expires (worker crashed or was restarted) are queued
+    again, up to JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                   id TEXT PRIMARY KEY,
+                   kind TEXT NOT NULL,
+                   payload TEXT NOT NULL,
+                   status TEXT NOT NULL,
+                   progress TEXT,
+                   result TEXT,
+                   error TEXT,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   worker TEXT,
+                   lease_expires_at REAL,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', '{}', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, status, progress, result, error, attempts, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "payload": json.loads(row[2]),
+            "status": row[3],
+            "progress": json.loads(row[4]) if row[4] else {},
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "attempts": row[7],
+            "created_at": row[8],
+            "updated_at": row[9],
+        }
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest queued job (recovering expired leases first)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker lost the job too many times', "
+                    "worker = NULL, lease_expires_at = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+                    (now, now, JOB_MAX_ATTEMPTS),
+                )
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires_at = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires_at < ?",
+                    (now, now),
+                )
+                row = self._db.execute(
+                    "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                        "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                        (worker, now + JOB_LEASE_SECONDS, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"job_id": row[0], "kind": row[1], "payload": json.loads(row[2])}
+
+    def heartbeat(self, job_id: str, worker: str, progress: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        with self._lock:
+            if progress is None:
+                self._db.execute(
+                    "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                    (now + JOB_LEASE_SECONDS, now, job_id, worker),
+                )
+            else:
+                self._db.execute(
+                    "UPDATE jobs SET lease_expires_at = ?, progress = ?, updated_at = ? WHERE id = ? AND worker = ?",
+                    (now + JOB_LEASE_SECONDS, json.dumps(progress), now, job_id, worker),
+                )
+
+    def finish(self, job_id: str, worker: str, status: str,
+               result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, worker = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE id = ? AND worker = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, worker),
+            )
+
+    def release(self, job_id: str, worker: str) -> None:
+        """Hand a job back to the queue (clean shutdown) without counting the attempt."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_expires_at = NULL, "
+                "attempts = attempts - 1, updated_at = ? WHERE id = ? AND worker = ?",
+                (time.time(), job_id, worker),
+            )
+
+
+# ------------------------------------------------------------
+# Job handlers
+# ------------------------------------------------------------
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+async def _run_generate_content(payload: Dict[str, Any], report: ProgressCallback) -> Dict[str, Any]:
+    request = load_course_request(payload["syllabus_name"], payload.get("allow_partial", False))
+    progress: Dict[str, Any] = {
+        "stage": "generating",
+        "modules_total": len(request.module_titles),
+        "modules_done": 0,
+        "modules_failed": 0,
+    }
+    report(progress)
+
+    def on_event(event: str, data: Dict[str, Any]):
+        if event == "module_finished":
+            progress["modules_done"] += 1
+        elif event == "module_failed":
+            progress["modules_failed"] += 1
+        elif event == "outline_saved":
+            progress["stage"] = "uploading"
+        elif event == "scorm_built":
+            progress["stage"] = "scorm_built"
+        elif event == "uploaded":
+            progress.setdefault("uploaded", []).append(data["blob"])
+        else:
+            return
+        report(progress)
+
+    result = await generate_course_content(request, on_event=on_event)
+    progress["stage"] = "done"
+    report(progress)
+    return result
+
+
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]] = {
+    "generate_content": _run_generate_content,
+}
+
+
+# ------------------------------------------------------------
+# Worker pool
+# ------------------------------------------------------------
+class JobWorkerPool:
+    """Run up to `concurrency` jobs at a time on the current event loop."""
+
+    def __init__(self, store: JobStore, concurrency: int = JOB_WORKERS):
+        self.store = store
+        self.concurrency = concurrency
+        self._tasks = []
+        self._stopping = False
+
+    def start(self) -> None:
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{base}:{n}")) for n in range(self.concurrency)
+        ]
+        print(f"[JOBS] Started {self.concurrency} job worker(s)")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, worker: str) -> None:
+        while not self._stopping:
+            try:
+                job = await asyncio.to_thread(self.store.claim, worker)
+            except Exception as e:
+                print(f"[JOBS] Failed to claim a job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+            await self._run(job, worker)
+
+    async def _run(self, job: Dict[str, Any], worker: str) -> None:
+        job_id = job["job_id"]
+        handler = JOB_HANDLERS.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(self.store.finish, job_id, worker, "failed",
+                                    error=f"Unknown job kind: {job['kind']}")
+            return
+
+        print(f"[JOBS] {worker} running {job['kind']} job {job_id}")
+
+        # report() is called synchronously from pipeline events; the latest progress is
+        # written from a worker thread, and bursts of events collapse into one write
+        latest: Dict[str, Any] = {}
+        writer: Optional[asyncio.Task] = None
+
+        async def write_progress():
+            while latest:
+                progress = latest.pop("progress")
+                try:
+                    await asyncio.to_thread(self.store.heartbeat, job_id, worker, progress)
+                except Exception as e:
+                    print(f"[JOBS] Failed to save progress of job {job_id}: {e}")
+
+        def report(progress: Dict[str, Any]):
+            nonlocal writer
+            latest["progress"] = json.loads(json.dumps(progress))  # snapshot; the handler keeps mutating it
+            if writer is None or writer.done():
+                writer = asyncio.create_task(write_progress())
+
+        async def keep_lease():
+            while True:
+                await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+                await asyncio.to_thread(self.store.heartbeat, job_id, worker)
+
+        lease = asyncio.create_task(keep_lease())
+        try:
+            result = await handler(job["payload"], report)
+            if writer is not None:
+                await writer
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.store.release, job_id, worker)
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            print(f"[JOBS] Job {job_id} failed: {detail}")
+            await asyncio.to_thread(self.store.finish, job_id, worker, "failed",
+                                    error=detail if isinstance(detail, str) else json.dumps(detail))
+        else:
+            await asyncio.to_thread(self.store.finish, job_id, worker, "succeeded", result=result)
+        finally:
+            lease.cancel()
+            if writer is not None:
+                writer.cancel()
+
+
+if __name__ == "__main__":
+    # Standalone worker process: `python jobs.py` (set JOB_WORKERS=0 on API instances)
+    async def _main():
+        pool = JobWorkerPool(JobStore(), concurrency=max(1, JOB_WORKERS))
+        pool.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await pool.stop()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,203 @@
+# llm_backends.py
+# Chat-completion backends behind gpt_engine. Selected with LLM_BACKEND=azure|fake.
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+CHARS_PER_TOKEN = 4
+
+
+class AzureOpenAIBackend:
+    """The production backend: one AsyncAzureOpenAI client with a pooled httpx transport."""
+
+    def __init__(self, max_connections: int, max_keepalive_connections: int,
+                 keepalive_expiry: float, timeout: float, connect_timeout: float):
+        self._settings = (max_connections, max_keepalive_connections, keepalive_expiry, timeout, connect_timeout)
+        self._client = None
+
+    def _get_client(self):
+        # Created lazily on the engine loop the first time it is used
+        if self._client is None:
+            import httpx
+            from openai import AsyncAzureOpenAI
+
+            max_connections, max_keepalive, keepalive_expiry, timeout, connect_timeout = self._settings
+            self._client = AsyncAzureOpenAI(
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                # retries are handled by the scheduler so they respect the rate limits
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_keepalive,
+                        keepalive_expiry=keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                ),
+            )
+        return self._client
+
+    async def create(self, **kwargs: Any) -> Any:
+        return await self._get_client().chat.completions.create(**kwargs)
+
+    async def close(self) -> None:
+        client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+
+# ------------------------------------------------------------
+# Deterministic fake for local runs and benchmarks
+# ------------------------------------------------------------
+_WORDS = (
+    "data model system process value design pattern method function structure "
+    "practice workflow concept principle tool example result analysis approach "
+    "component layer interface performance quality review strategy step case"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(max(1, words // 14)))
+
+
+def _fake_syllabus(prompt: str, rng: random.Random) -> str:
+    topic = re.search(r"topic '([^']*)'", prompt)
+    topic = topic.group(1) if topic else "the topic"
+    count = re.search(r"Number of modules required:\s*(\d+)", prompt)
+    count = int(count.group(1)) if count else 5
+    lines = [f"Course Syllabus: {topic}", ""]
+    for i in range(1, count + 1):
+        lines.append(f"Module {i}: {topic} {rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()} {i}")
+        lines.append(_sentence(rng, 18))
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def _fake_module(prompt: str, rng: random.Random) -> str:
+    title = re.search(r"Module:\s*(.*)", prompt)
+    title = title.group(1).strip() if title else "Module"
+    subtopics = [f"{title} {rng.choice(_WORDS).title()} {n}" for n in range(1, rng.randint(5, 6) + 1)]
+    parts = [
+        "1. Introduction:", _paragraph(rng, 170), "",
+        "2. Explanation:", _paragraph(rng, 400), "",
+        "3. Subtopics:", "\n".join(f"- {s}" for s in subtopics), "",
+        "4. Subtopic Explanation:", "",
+    ]
+    for s in subtopics:
+        parts += [
+            s,
+            f"Explanation: {_paragraph(rng, 120)}",
+            f"Syntax: {rng.choice(_WORDS)}({rng.choice(_WORDS)}, {rng.choice(_WORDS)})",
+            f"Example: {_sentence(rng, 20)}",
+            "",
+        ]
+    return "\n".join(parts).strip()
+
+
+def _fake_questions(prompt: str, rng: random.Random) -> str:
+    count = re.search(r"Create exactly (\d+) questions", prompt)
+    count = int(count.group(1)) if count else 5
+    questions = []
+    for _ in range(count):
+        answer = rng.randint(0, 3)
+        questions.append({
+            "q": _sentence(rng, 10).rstrip(".") + "?",
+            "type": "mcq",
+            "options": [_sentence(rng, 4).rstrip(".") for _ in range(4)],
+            "answer_index": answer,
+        })
+    return json.dumps(questions)
+
+
+def _fake_career_path(prompt: str, rng: random.Random) -> str:
+    courses = []
+    for i in range(rng.randint(4, 6)):
+        name = f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()} {i + 1}"
+        courses.append({
+            "course_name": name,
+            "description": _sentence(rng, 16),
+            "category": rng.choice(["Technical", "Leadership", "Business", "Communication"]),
+            "level": rng.choice(["Beginner", "Intermediate", "Advanced"]),
+            "estimated_hours": rng.randint(4, 40),
+            "mandatory": rng.random() < 0.5,
+            "thumbnail_url": f"https://images.example.com/{name.lower().replace(' ', '-')}.jpg",
+        })
+    return json.dumps({"courses": courses})
+
+
+def fake_completion_text(messages: List[Dict[str, Any]]) -> str:
+    """Realistic, deterministic output for each prompt shape this app sends."""
+    prompt = "\n".join(str(m.get("content") or "") for m in messages)
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    if "Create a course syllabus" in prompt:
+        return _fake_syllabus(prompt, rng)
+    if "Generate detailed content ONLY for this module" in prompt:
+        return _fake_module(prompt, rng)
+    if "Return ONLY a JSON array" in prompt:
+        return _fake_questions(prompt, rng)
+    if "career path advisor" in prompt:
+        return _fake_career_path(prompt, rng)
+    return _paragraph(rng, 120)
+
+
+class FakeLLMBackend:
+    """
+    Stands in for Azure OpenAI with the same response shapes (choices, usage,
+    streamed chunks). `latency` is the time to first token and
+    `tokens_per_second` paces the completion (0 = instant).
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+
+    @staticmethod
+    def _usage(messages: List[Dict[str, Any]], text: str) -> SimpleNamespace:
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // CHARS_PER_TOKEN
+        completion_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens)
+
+    def _generation_time(self, text: str) -> float:
+        if not self.tokens_per_second:
+            return 0.0
+        return (len(text) / CHARS_PER_TOKEN) / self.tokens_per_second
+
+    async def create(self, *, messages: List[Dict[str, Any]], stream: bool = False,
+                     stream_options: Optional[Dict[str, Any]] = None, **_: Any) -> Any:
+        text = fake_completion_text(messages)
+        usage = self._usage(messages, text)
+        await asyncio.sleep(self.latency)
+        if stream:
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return self._stream(text, usage if include_usage else None)
+        await asyncio.sleep(self._generation_time(text))
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                               usage=usage)
+
+    async def _stream(self, text: str, usage: Optional[SimpleNamespace]) -> AsyncIterator[SimpleNamespace]:
+        pieces = re.findall(r"\S+\s*", text) or [text]
+        delay = self._generation_time(text) / len(pieces)
+        for piece in pieces:
+            if delay:
+                await asyncio.sleep(delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece))],
+                                  usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,172 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """
+    Two-tier, content-addressed cache for LLM completions.
+
+    - memory: LRU of the most recently used responses (per process)
+    - disk: SQLite table shared by every worker on the instance
+
+    Entries expire after `ttl_seconds` (0 disables expiry); the disk tier is
+    trimmed to `max_disk_bytes` by evicting the least recently used rows.
+
+    Disk reads and writes block on SQLite, so async callers run get/set in a
+    worker thread (see gpt_engine) and use peek() for the memory tier. The
+    memory tier has its own lock, so a memory hit never waits for disk I/O.
+    """
+
+    # evict down to this share of max_disk_bytes, so not every write evicts
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, memory_entries: int = 512,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   value TEXT NOT NULL,
+                   size INTEGER NOT NULL,
+                   created_at REAL NOT NULL,
+                   accessed_at REAL NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        # running total of the table's size; other processes write too, so it is
+        # recounted before evicting
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(messages: Any, deployment: Optional[str], temperature: float, **params: Any) -> str:
+        payload = {
+            "messages": messages,
+            "deployment": deployment,
+            "temperature": temperature,
+            "params": {k: v for k, v in params.items() if v is not None},
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def peek(self, key: str) -> Optional[str]:
+        """Memory tier only; never touches the disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self._expired(created_at, now):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._stats["memory_hits"] += 1
+            return value
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.peek(key)
+        if value is not None:
+            return value
+
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at, size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= row[2]
+                row = None
+            if row is not None:
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self._stats["disk_hits"] += 1
+        return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["writes"] += 1
+        with self._db_lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk(now)
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float) -> None:
+        """Drop expired rows, then the least recently used ones down to EVICT_TO (under _db_lock)."""
+        evicted = 0
+        if self.ttl_seconds:
+            evicted += self._db.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        excess = total - int(self.max_disk_bytes * self.EVICT_TO)
+        if excess > 0:
+            # oldest rows whose sizes, summed before them, are still short of the excess
+            evicted += self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at, key) - size AS before"
+                " FROM responses) WHERE before < ?)",
+                (excess,),
+            ).rowcount
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._disk_bytes = total
+        with self._lock:
+            self._stats["evictions"] += evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            self._db.execute("DELETE FROM responses")
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        with self._db_lock:
+            stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
@@ -0,0 +1,171 @@
+# llm_scheduler.py
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+try:
+    import openai
+    _TRANSIENT_ERRORS = (openai.APIConnectionError, openai.APITimeoutError)
+except ImportError:  # fake/offline backends
+    _TRANSIENT_ERRORS = ()
+
+T = TypeVar("T")
+
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute; per_minute <= 0 means unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.rate)
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (positive) or charge (negative) units once the real cost is known."""
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + delta)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int], default_completion: int) -> int:
+    """Rough prompt size (chars / 4) plus the completion budget, as Azure counts it against TPM."""
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return prompt_chars // CHARS_PER_TOKEN + (max_tokens or default_completion)
+
+
+def _retry_after_seconds(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except Exception:
+                return None
+    return None
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if _TRANSIENT_ERRORS and isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    status = getattr(error, "status_code", None)
+    return status in (408, 409, 429) or (isinstance(status, int) and status >= 500)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls on a single event loop.
+
+    Requests wait (FIFO) until both the requests/minute and tokens/minute
+    buckets have room, then run. 429s and transient failures are retried
+    with jittered exponential backoff that honours Retry-After; a 429 also
+    pauses admission for everyone until the server's cooldown has passed.
+    The buckets only see this process's calls; gpt_engine gives each process
+    its share of the deployment quota (LLM_QUOTA_PROCESSES).
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._lock = asyncio.Lock()
+        self._cooldown_until = 0.0
+        self._stats = {
+            "queue_depth": 0,
+            "in_flight": 0,
+            "requests": 0,
+            "throttled": 0,
+            "retries": 0,
+            "failures": 0,
+            "wait_seconds_total": 0.0,
+        }
+
+    async def _acquire(self, tokens: int) -> None:
+        self._stats["queue_depth"] += 1
+        started = time.monotonic()
+        try:
+            async with self._lock:
+                while True:
+                    now = time.monotonic()
+                    wait = max(
+                        self._cooldown_until - now,
+                        self.requests.wait_time(1, now),
+                        self.tokens.wait_time(tokens, now),
+                    )
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return
+                    await asyncio.sleep(wait)
+        finally:
+            self._stats["queue_depth"] -= 1
+            self._stats["wait_seconds_total"] += time.monotonic() - started
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            self._stats["in_flight"] += 1
+            self._stats["requests"] += 1
+            try:
+                return await call()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self._stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                if getattr(e, "status_code", None) == 429:
+                    self._stats["throttled"] += 1
+                    self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+                self._stats["retries"] += 1
+                attempt += 1
+                print(f"[WARN] LLM call failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            finally:
+                self._stats["in_flight"] -= 1
+            await asyncio.sleep(delay)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int) -> None:
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
@@ -1,17 +1,19 @@
-import tempfile
+import asyncio
 import uuid
 from dotenv import load_dotenv
 
-from gpt_engine import call_gpt
+from gpt_engine import shutdown_engine
 
 load_dotenv()
 
-from fastapi import Body, FastAPI, HTTPException, Depends
+from fastapi import Body, FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from models import SyllabusRequest, UpdateContentRequest
 
-from generator import generate_syllabus_prompt
+from generator import generate_syllabus_prompt_async
 from sqlalchemy import Column, String, Date
 from sqlalchemy.ext.declarative import declarative_base
 from chatbot_logic import get_report_categories, get_courses_by_status, handle_selection
@@ -23,26 +25,41 @@ from career_path import (
 
 from datetime import datetime
 import urllib.parse
+import hmac
 import json
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from auth.identity import GetCurrentUser
+from typing import Callable, List, Dict, Any, Optional
+from auth.identity import GetCurrentUser, security
 from auth.swagger_oauth import (
     get_swagger_ui_parameters,
     get_oauth2_scheme_config,
     ENABLE_SWAGGER_OAUTH,
 )
 
-from scorm_exporter import generate_scorm
+from scorm_exporter import build_scorm_package, scorm_build_key
+from course_ast import diff_modules, module_hashes, parse_outline_cached
+from content_pipeline import (
+    GENERATED_DIR,
+    DETAILED_DIR,
+    load_course_request,
+    generate_course_content,
+    current_package,
+    meta_question_bank,
+    store_question_bank,
+)
+from jobs import JOB_WORKERS, JobStore, JobWorkerPool
+from blob_storage import close_blob_storage, upload_blobs
+from blob_catalog import BLOB_LIST_PAGE_SIZE, CatalogEntry, catalog, iter_scorm_pages
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from metrics import REGISTRY
+from singleflight import SingleFlight, request_key
 from azure_blob_utils import (
-    upload_file_to_blob,
-    list_all_scorm_files,
     list_blobs_in_container,
-    search_scorm_files,
-    filter_scorm_files,
     blob_service_client,
     AZURE_BLOB_CONTAINER,
     get_blob_sas_url,
+    get_blob_sas_urls,
+    blob_exists,
 )
 import os
 import zipfile
@@ -60,10 +77,47 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
-GENERATED_DIR = "generated_syllabus"
+
+job_store = JobStore()
+singleflight = SingleFlight()
+job_pool = JobWorkerPool(job_store, concurrency=JOB_WORKERS)
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    if JOB_WORKERS > 0:
+        job_pool.start()
+
+
+@app.on_event("startup")
+def start_blob_catalog():
+    catalog.start()
+
+
+@app.on_event("shutdown")
+def stop_blob_catalog():
+    catalog.stop()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_pool.stop()
+
+
+@app.on_event("shutdown")
+def close_llm_client():
+    shutdown_engine()
+
+
+@app.on_event("shutdown")
+async def close_blob_client():
+    await close_blob_storage()
+
 VERIFIED_DIR = "verified_syllabus"
-DETAILED_DIR = "detailed_courses"
 FINAL_DIR = "final_courses"
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# Static bearer token a Prometheus scraper can use for /metrics instead of a user token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 os.makedirs(GENERATED_DIR, exist_ok=True)
 os.makedirs(DETAILED_DIR, exist_ok=True)
 os.makedirs(FINAL_DIR, exist_ok=True)
@@ -123,9 +177,17 @@ app.mount("/scorm", StaticFiles(directory=DETAILED_DIR), name="scorm")
 
 
 @app.post("/generate_syllabus/")
-def generate_syllabus(
+async def generate_syllabus(
     request: SyllabusRequest, current_user: dict = Depends(GetCurrentUser)):
-    syllabus = generate_syllabus_prompt(request.dict())
+    # duplicate submissions (double clicks, frontend retries) share one generation
+    return await singleflight.do(
+        request_key("generate_syllabus", request.dict()),
+        lambda: _create_syllabus(request),
+    )
+
+
+async def _create_syllabus(request: SyllabusRequest):
+    syllabus = await generate_syllabus_prompt_async(request.dict())
     syllabus_id = str(uuid.uuid4())
     name = f"{request.topic.replace(' ', '_').lower()}_{request.audience.lower()}_{syllabus_id[:8]}"
     folder = os.path.join(GENERATED_DIR, name)
@@ -164,134 +226,99 @@ def get_generated_syllabus(current_user: dict = Depends(GetCurrentUser)):
     return items
 
 @app.post("/generate_content_from_syllabus/{syllabus_name}")
-def generate_detailed_content_from_syllabus(syllabus_name: str, current_user: dict = Depends(GetCurrentUser)):
-
-    syllabus_path = os.path.join(GENERATED_DIR, syllabus_name, "syllabus.txt")  
-    meta_path = os.path.join(GENERATED_DIR, syllabus_name, "meta.json")
-    course_id = str(uuid.uuid4())
-    meta = {}   # meta initialization
-
-    if not os.path.exists(syllabus_path):
-        raise HTTPException(status_code=404, detail="Syllabus not found.")
-
-    # Read syllabus
-    with open(syllabus_path, "r", encoding="utf-8") as f:
-        syllabus = f.read()
-
-    # Read meta (tone + assessment config)
-    ai_tone = "Formal"
-    assessment_type = None
-    attempts = None
-
-    if os.path.exists(meta_path):
-        try:
-            with open(meta_path, "r", encoding="utf-8") as m:
-                meta = json.load(m)
-                ai_tone = meta.get("ai_tone", "Formal")
-                assessment_type = meta.get("assessment_type")
-                attempts = meta.get("attempts")
-        except Exception:
-            pass
-    # Attach course_id AFTER meta is loaded
-    meta["course_id"] = course_id
-
-    # STEP 1: Extract modules from syllabus
-    import re
-    module_titles = re.findall(r"Module\s+\d+:\s*(.*)", syllabus)
-
-    if not module_titles:
-        raise HTTPException(status_code=400, detail="No modules found in syllabus.")
-
-    # STEP 2: Generate content module-by-module (KEY FIX)
-    detailed_content = ""
-    separator = "\n\n--------------------------------------------\n\n"
-
-    for idx, module_title in enumerate(module_titles, start=1):
-        print(f"[INFO] Generating Module {idx}: {module_title}")
-
-        module_content = call_gpt(f"""
-You are an expert instructional designer.
-
-Generate detailed content ONLY for this module:
-
-Module: {module_title}
-
-STRUCTURE:
-
-1. Introduction:
-(150–200 words)
-
-2. Explanation:
-(300–500 words)
-
-3. Subtopics:
-- Minimum 5 and maximum 6 subtopics
-
-4. Subtopic Explanation:
-
-For EACH subtopic include:
-- Explanation (100–150 words)
-- Syntax (if applicable)
-- Example (code or real-world)
-
-STRICT RULES:
-- Do NOT generate other modules
-- Do NOT stop early
-- Do NOT use markdown (#, *, etc.)
-- Use plain text only
-- Keep it beginner-friendly and practical
+async def generate_detailed_content_from_syllabus(
+    syllabus_name: str,
+    allow_partial: bool = Query(False, description="publish even if some modules failed"),
+    current_user: dict = Depends(GetCurrentUser),
+):
+    request = load_course_request(syllabus_name, allow_partial)
+    return await singleflight.do(
+        request_key("generate_content", {"syllabus_name": syllabus_name, "allow_partial": allow_partial}),
+        lambda: generate_course_content(request),
+    )
 
-Tone: {ai_tone}
-""".strip())
 
-        detailed_content += f"{separator}Module {idx}: {module_title}\n\n"
-        detailed_content += module_content.strip()
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    # STEP 3: Save locally (outline.txt)
-    folder = os.path.join(DETAILED_DIR, syllabus_name)
-    os.makedirs(folder, exist_ok=True)
 
-    outline_path = os.path.join(folder, "outline.txt")
+@app.post("/generate_content_from_syllabus/{syllabus_name}/stream")
+async def stream_detailed_content_from_syllabus(
+    syllabus_name: str,
+    allow_partial: bool = Query(False, description="publish even if some modules failed"),
+    current_user: dict = Depends(GetCurrentUser),
+):
+    """
+    Same pipeline as /generate_content_from_syllabus, streamed as Server-Sent Events:
+    started, module_started, token, module_finished/module_failed, outline_saved,
+    scorm_built, uploaded, then done (full response body) or error.
+    """
+    request = load_course_request(syllabus_name, allow_partial)
+    queue: asyncio.Queue = asyncio.Queue()
 
-    with open(outline_path, "w", encoding="utf-8") as f:
-        f.write(detailed_content)
+    def on_event(event: str, data: Dict[str, Any]):
+        queue.put_nowait((event, data))
 
-    # STEP 4: Upload outline to Azure
-    upload_file_to_blob(
-        outline_path,
-        f"{syllabus_name}/outline.txt"
+    async def run():
+        try:
+            result = await generate_course_content(request, on_event=on_event, stream=True)
+            on_event("done", result)
+        except HTTPException as e:
+            on_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            on_event("error", {"status_code": 500, "detail": str(e)})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # client went away before the pipeline finished
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # STEP 5: Upload meta.json
-    with open(meta_path, "w", encoding="utf-8") as m:
-        json.dump(meta, m)
+# ============================================================
+# Background jobs
+# ============================================================
 
-    # Upload updated meta
-    upload_file_to_blob(
-        meta_path,
-        f"{syllabus_name}/meta.json"
-    )
 
-    # STEP 6: Generate SCORM
-    zip_path = generate_scorm(
-        detailed_content,
-        output_dir=folder,
-        assessment_type=assessment_type,
-        attempts=attempts,
-        course_id=course_id
-    )
+@app.post("/jobs/generate_content/{syllabus_name}", status_code=202)
+def enqueue_content_generation(
+    syllabus_name: str,
+    allow_partial: bool = Query(False, description="publish even if some modules failed"),
+    current_user: dict = Depends(GetCurrentUser),
+):
+    """Queue /generate_content_from_syllabus as a background job; poll /jobs/{job_id}."""
+    load_course_request(syllabus_name)  # fail fast on unknown syllabus / no modules
+    job_id = job_store.enqueue("generate_content", {"syllabus_name": syllabus_name, "allow_partial": allow_partial})
+    return {"job_id": job_id, "status": "queued"}
 
-    # STEP 7: Upload SCORM
-    blob_name = f"{syllabus_name}.zip"
-    scorm_url = upload_file_to_blob(zip_path, blob_name)
 
-    # FINAL RESPONSE
-    return {
-        "course_name": syllabus_name,
-        "outline": detailed_content,
-        "scorm_url": scorm_url,
-        "editable": True
-    }
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, current_user: dict = Depends(GetCurrentUser)):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
 
 def upload_text_to_blob(blob_name: str, content: str):
     blob_client = blob_service_client.get_blob_client(
@@ -309,115 +336,197 @@ def download_blob_as_text(blob_name: str) -> str:
     return blob_client.download_blob().readall().decode("utf-8")
 
 @app.post("/update_detailed_content/{syllabus_name}")
-def update_detailed_content(
+async def update_detailed_content(
     syllabus_name: str,
     updated_content: str = Body(..., media_type="text/plain"), current_user: dict = Depends(GetCurrentUser)
 ):
 
-    assessment_type = None
-    attempts = None
+    # meta.json carries the assessment settings and version history we append to,
+    # so rebuilding without it would publish a package that nothing points at
     try:
-        meta_content = download_blob_as_text(f"{syllabus_name}/meta.json")
+        meta_content = await asyncio.to_thread(download_blob_as_text, f"{syllabus_name}/meta.json")
         meta = json.loads(meta_content)
-        assessment_type = meta.get("assessment_type")
-        attempts = meta.get("attempts")
-    except:
-        pass
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Course not found (no meta.json).")
+    except ValueError:
+        raise HTTPException(status_code=500, detail="Course meta.json is not valid JSON.")
+    except HttpResponseError as e:
+        raise HTTPException(status_code=502, detail=f"Could not read meta.json: {e.message}")
+    if not isinstance(meta, dict):
+        raise HTTPException(status_code=500, detail="Course meta.json is not valid JSON.")
+    assessment_type = meta.get("assessment_type")
+    attempts = meta.get("attempts")
+
+    # Unchanged outline + assessment settings: the current package is still valid,
+    # so skip question generation, rendering, upload and the meta rewrite
+    build_key = scorm_build_key(updated_content, syllabus_name, assessment_type, attempts)
+    current = current_package(syllabus_name, meta)
+    if current and current["build_key"] == build_key and await asyncio.to_thread(blob_exists, current["blob"]):
+        return {
+            "message": "Content unchanged",
+            "course_id": current["course_id"],
+            "scorm_url": get_blob_sas_url(current["blob"]),
+            "unchanged": True
+        }
+
+    # Which modules the edit touched; unchanged ones are served from the fragment cache
+    course = parse_outline_cached(updated_content)
+    changed_modules = diff_modules(meta.get("module_hashes") or [], course)
 
     # Generate NEW course_id for this version
     course_id = str(uuid.uuid4())
 
-    # Generate SCORM in temp folder
-    with tempfile.TemporaryDirectory() as tmp_dir:
+    # Build SCORM in memory and upload it straight from the buffer
+    package = await asyncio.to_thread(
+        build_scorm_package,
+        updated_content,
+        course_name=syllabus_name,
+        assessment_type=assessment_type,
+        attempts=attempts,
+        course_id=course_id,
+        # reuse the bank recorded in meta.json while it still matches the outline
+        questions=meta_question_bank(meta, updated_content, assessment_type)
+    )
 
-        outline_path = os.path.join(tmp_dir, "outline.txt")
-        with open(outline_path, "w", encoding="utf-8") as f:
-            f.write(updated_content)
+    # Generate timestamp
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
 
-        zip_path = generate_scorm(
-            updated_content,
-            output_dir=tmp_dir,
-            assessment_type=assessment_type,
-            attempts=attempts,
-            course_id=course_id
-        )
+    # Create versioned name
+    versioned_name = f"{syllabus_name}_updated_{timestamp}.zip"
 
-        # Generate timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
+     # Update meta.json with version tracking
+    meta.setdefault("versions", [])
 
-        # Create versioned name
-        versioned_name = f"{syllabus_name}_updated_{timestamp}.zip"
+    meta["versions"].append({
+        "course_id": course_id,
+        "updated_at": timestamp,
+        "scorm_file": versioned_name,
+        "build_key": build_key
+    })
+
+    meta["latest_course_id"] = course_id
+    meta["module_hashes"] = module_hashes(course)
+    store_question_bank(meta, updated_content, assessment_type)
+
+    # Upload the package, overwrite the outline and save meta back, all at once
+    scorm, _, _ = await upload_blobs([
+        (package, f"{syllabus_name}/{versioned_name}"),
+        (updated_content.encode("utf-8"), f"{syllabus_name}/outline.txt"),
+        (json.dumps(meta).encode("utf-8"), f"{syllabus_name}/meta.json"),
+    ])
 
-        scorm_url = upload_file_to_blob(
-            zip_path,
-            f"{syllabus_name}/{versioned_name}"
-        )
+    return {
+        "message": "Content updated successfully",
+        "course_id": course_id,
+        "scorm_url": scorm.url,
+        "changed_modules": changed_modules
+    }
 
-        # Overwrite outline in Azure directly
-        upload_text_to_blob(
-            blob_name=f"{syllabus_name}/outline.txt",
-            content=updated_content
-        )
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-         # Update meta.json with version tracking
-        meta.setdefault("versions", [])
 
-        meta["versions"].append({
-            "course_id": course_id,
-            "updated_at": timestamp,
-            "scorm_file": versioned_name
-        })
+def _final_course(entry: CatalogEntry, scorm_url: str) -> Dict[str, Any]:
+    return {
+        "course_name": entry.course_name,
+        "scorm_url": scorm_url,
+        "size": entry.size,
+        "last_modified": entry.last_modified,
+    }
 
-        meta["latest_course_id"] = course_id
 
-        # save back
-        upload_text_to_blob(
-            blob_name=f"{syllabus_name}/meta.json",
-            content=json.dumps(meta)
-        )
+def _unsigned_urls(blob_names: List[str]) -> List[str]:
+    base = f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_BLOB_CONTAINER}/"
+    return [base + name for name in blob_names]
+
+
+def _final_courses(request: Request, text: Optional[str], prefix: Optional[str], limit: Optional[int],
+                   cursor: Optional[str], format: Optional[str], urls: Callable[[List[str]], List[str]]):
+    """
+    Shared by the /final_courses endpoints.
+      - default: the whole (matching) list from the blob catalog, as before
+      - limit/cursor: one storage page, {"items": [...], "next_cursor": ...}
+      - format=ndjson (or Accept: application/x-ndjson): one JSON object per line,
+        streamed page by page; with limit, one page then {"next_cursor": ...}
+    Storage pages use the blob continuation token as cursor and push `prefix`
+    down as name_starts_with; `text` (search/filter) is matched within each page.
+    """
+    prefix = prefix or ""
+    needle = text.lower() if text is not None else None
+
+    def matching(entries: List[CatalogEntry]) -> List[Dict[str, Any]]:
+        if needle is not None:
+            entries = [entry for entry in entries if needle in entry.name.lower()]
+        # signed as one batch per page (see azure_blob_utils.BlobSasSigner)
+        return [_final_course(entry, url) for entry, url in zip(entries, urls([e.name for e in entries]))]
+
+    ndjson = format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    if not (ndjson or limit or cursor):
+        entries = catalog.search(text) if text is not None else catalog.list(prefix)
+        if text is not None and prefix:
+            entries = [entry for entry in entries if entry.name.startswith(prefix)]
+        return matching(entries)
+
+    pages = iter_scorm_pages(prefix, limit or BLOB_LIST_PAGE_SIZE, cursor)
+    try:
+        # first page up front, so a bad cursor or storage error is still an HTTP error
+        entries, next_cursor = next(pages, ([], None))
+    except HttpResponseError as e:
+        raise HTTPException(status_code=400 if cursor else 502, detail=f"Listing failed: {e.message}")
+
+    if ndjson:
+        def lines():
+            page, token = entries, next_cursor
+            while True:
+                for item in matching(page):
+                    yield json.dumps(item) + "\n"
+                if limit:
+                    yield json.dumps({"next_cursor": token}) + "\n"
+                    return
+                if token is None:
+                    return
+                page, token = next(pages, ([], None))
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+    return {"items": matching(entries), "next_cursor": next_cursor}
 
-    return {
-        "message": "Content updated successfully",
-        "course_id": course_id,
-        "scorm_url": scorm_url
-    }
 
 @app.get("/final_courses/")
-def list_final_courses(current_user: dict = Depends(GetCurrentUser)):
-    files = list_all_scorm_files()
-    return [
-        {
-            "course_name": os.path.splitext(os.path.basename(f))[0],
-            "scorm_url": f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_BLOB_CONTAINER}/{f}",
-        }
-        for f in files
-    ]
+def list_final_courses(
+    request: Request,
+    prefix: Optional[str] = Query(None, description="only blobs whose name starts with this"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="page size; enables cursor pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(GetCurrentUser),
+):
+    return _final_courses(request, None, prefix, limit, cursor, format, _unsigned_urls)
 
 
 @app.get("/final_courses/search")
 def search_final_courses(
-    query: str = Query(...), current_user: dict = Depends(GetCurrentUser)
+    request: Request,
+    query: str = Query(...),
+    prefix: Optional[str] = Query(None, description="only blobs whose name starts with this"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="page size; enables cursor pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(GetCurrentUser),
 ):
-    files = search_scorm_files(query)
-    results = []
-    for f in files:
-        course_name = os.path.splitext(os.path.basename(f))[0]
-        scorm_url = get_blob_sas_url(f)  # Same format as upload_file_to_blob
-        results.append({"course_name": course_name, "scorm_url": scorm_url})
-    return results
+    # Same format as upload_file_to_blob
+    return _final_courses(request, query, prefix, limit, cursor, format, get_blob_sas_urls)
 
 
 @app.get("/final_courses/filter")
 def filter_final_courses(
-    filter: str = Query(...), current_user: dict = Depends(GetCurrentUser)
+    request: Request,
+    filter: str = Query(...),
+    prefix: Optional[str] = Query(None, description="only blobs whose name starts with this"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="page size; enables cursor pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(GetCurrentUser),
 ):
-    files = filter_scorm_files(filter)
-    results = []
-    for f in files:
-        course_name = os.path.splitext(os.path.basename(f))[0]
-        scorm_url = get_blob_sas_url(f)  # Same format as upload_file_to_blob
-        results.append({"course_name": course_name, "scorm_url": scorm_url})
-    return results
+    return _final_courses(request, filter, prefix, limit, cursor, format, get_blob_sas_urls)
 
 
 # ============================================================
@@ -457,16 +566,29 @@ def root():
     return {"message": "LMS Unified API running successfully!"}
 
 
+async def MetricsScraper(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> dict:
+    """METRICS_TOKEN if it is set and matches, otherwise the same auth as every other endpoint."""
+    if METRICS_TOKEN and credentials and hmac.compare_digest(credentials.credentials, METRICS_TOKEN):
+        return {"user_id": "metrics", "scopes": [], "client_id": None, "token_info": {}}
+    return await GetCurrentUser(credentials)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(current_user: dict = Depends(MetricsScraper)):
+    """Prometheus scrape endpoint (LLM latency/tokens, cache, scheduler, pipeline stages)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 #####Career path endpoint
 @app.post("/career-path/", response_model=CareerPathResponse)
-def generate_career_path(
+async def generate_career_path(
     request: CareerPathRequest, current_user: dict = Depends(GetCurrentUser)
 ):
     """
     Generate career path courses based on user input (Business Analyst → Program Manager, etc.)
     """
     try:
-        response = generate_career_path_logic(request)
+        response = await generate_career_path_logic(request)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,224 @@
+# scorm_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+SCORM_BUILD_CACHE_ENABLED = os.getenv("SCORM_BUILD_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SCORM_BUILD_CACHE_DIR = os.getenv("SCORM_BUILD_CACHE_DIR", os.path.join(".cache", "scorm_builds"))
+SCORM_BUILD_CACHE_MAX_MB = int(os.getenv("SCORM_BUILD_CACHE_MAX_MB", "512"))
+
+
+class ScormBuildCache:
+    """
+    Finished SCORM packages on local disk, keyed by everything that shapes the
+    package except course_id: <dir>/<key>.zip plus <key>.json holding the
+    course_id it was stamped with and the assessment questions, so a build
+    for a new course_id only needs to re-render assessment.html. Questions
+    are also kept on their own (<dir>/questions/<key>.json), keyed by the
+    text they were generated from, so edits elsewhere in the outline reuse them.
+    Rendered module HTML is kept the same way (<dir>/fragments/<key>.html), so
+    a one-module edit re-renders only that module, even in a fresh process.
+
+    The directory, questions and fragments included, is trimmed to `max_bytes` by evicting
+    the least recently used entries. Writes only add to a running total; the
+    directory is scanned once, then again only when that total passes
+    `max_bytes` (other processes' writes are picked up by that rescan).
+    """
+
+    # evict down to this share of max_bytes, so not every write rescans
+    EVICT_TO = 0.9
+    # a .tmp file older than this was left behind by a write that crashed
+    STALE_TMP_SECONDS = 3600
+
+    def __init__(self, directory: str = SCORM_BUILD_CACHE_DIR, max_bytes: int = SCORM_BUILD_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # bytes on disk as of the last scan plus what this process wrote since; None until scanned
+        self._bytes: Optional[int] = None
+        self._stats = {"hits": 0, "restamps": 0, "misses": 0, "writes": 0, "evictions": 0,
+                       "question_hits": 0}
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return os.path.join(self.directory, f"{key}.zip"), os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """{"data": zip bytes, "course_id": ..., "questions": [...]} or None."""
+        zip_path, info_path = self._paths(key)
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            with open(zip_path, "rb") as f:
+                info["data"] = f.read()
+            now = time.time()
+            os.utime(info_path, (now, now))
+        except (OSError, ValueError):
+            self.record("misses")
+            return None
+        return info
+
+    def set(self, key: str, data: bytes, course_id: str, questions: Optional[list]) -> None:
+        zip_path, info_path = self._paths(key)
+        suffix = f".{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(zip_path + suffix, "wb") as f:
+                f.write(data)
+            with open(info_path + suffix, "w", encoding="utf-8") as f:
+                json.dump({"course_id": course_id, "questions": questions, "created_at": time.time()}, f)
+            replaced = _size(zip_path) + _size(info_path)
+            # zip first: a reader that finds the .json always finds a matching .zip
+            os.replace(zip_path + suffix, zip_path)
+            os.replace(info_path + suffix, info_path)
+            written = _size(zip_path) + _size(info_path)
+        except OSError as e:
+            print(f"[WARN] SCORM build cache write failed: {e}")
+            return
+        self.record("writes")
+        self._added(written - replaced)
+
+    def _question_path(self, key: str) -> str:
+        return os.path.join(self.directory, "questions", f"{key}.json")
+
+    def get_questions(self, key: str) -> Optional[list]:
+        path = self._question_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                questions = json.load(f)
+            now = time.time()
+            os.utime(path, (now, now))
+        except (OSError, ValueError):
+            return None
+        self.record("question_hits")
+        return questions
+
+    def set_questions(self, key: str, questions: list) -> None:
+        self._write_side(self._question_path(key), json.dumps(questions), "question")
+
+    def _fragment_path(self, key: str) -> str:
+        return os.path.join(self.directory, "fragments", f"{key}.html")
+
+    def get_fragment(self, key: str) -> Optional[str]:
+        path = self._fragment_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                fragment = f.read()
+            now = time.time()
+            os.utime(path, (now, now))
+        except OSError:
+            return None
+        return fragment
+
+    def set_fragment(self, key: str, fragment: str) -> None:
+        self._write_side(self._fragment_path(key), fragment, "fragment")
+
+    def _write_side(self, path: str, text: str, what: str) -> None:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            replaced = _size(path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] SCORM {what} cache write failed: {e}")
+            return
+        self._added(_size(path) - replaced)
+
+    def record(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _added(self, size: int) -> None:
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+                if self._bytes <= self.max_bytes:
+                    return
+        self._trim()
+
+    def _scan(self, directory: str, now: float, entries: list) -> int:
+        """Add (last used, paths, size) for everything in `directory`; returns the bytes found."""
+        total = 0
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return 0
+        names = set(names)
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp"):
+                if now - stat.st_mtime > self.STALE_TMP_SECONDS:
+                    _remove(path)
+                else:
+                    total += stat.st_size
+                continue
+            if name.endswith(".zip"):
+                # a package is counted with its .json; this one lost it (crash, eviction race)
+                if f"{name[:-4]}.json" not in names:
+                    entries.append((stat.st_mtime, (path,), stat.st_size))
+                    total += stat.st_size
+                continue
+            if not name.endswith((".json", ".html")):
+                continue
+            paths = (path,)
+            size = stat.st_size
+            zip_name = f"{name[:-5]}.zip"
+            if name.endswith(".json") and zip_name in names:
+                # a package's .json goes first: readers treat a .zip without it as a miss
+                paths = (path, os.path.join(directory, zip_name))
+                size += _size(paths[1])
+            entries.append((stat.st_mtime, paths, size))
+            total += size
+        return total
+
+    def _trim(self) -> None:
+        """Rescan, then evict least recently used packages, question sets and fragments down to EVICT_TO."""
+        now = time.time()
+        entries = []  # (last used, paths, size)
+        total = self._scan(self.directory, now, entries)
+        for side in ("questions", "fragments"):
+            total += self._scan(os.path.join(self.directory, side), now, entries)
+
+        if total > self.max_bytes:
+            target = int(self.max_bytes * self.EVICT_TO)
+            for _, paths, size in sorted(entries):
+                if total <= target:
+                    break
+                for path in paths:
+                    _remove(path)
+                total -= size
+                self.record("evictions")
+        with self._lock:
+            self._bytes = total
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, bytes=self._bytes or 0)
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,9 +1,19 @@
 # scorm_exporter.py
+import io
 import os
+import re
+import threading
+import time
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import html
 import json
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from course_ast import Course, Module, outline_hash, parse_outline_cached
+from metrics import REGISTRY
+from scorm_cache import SCORM_BUILD_CACHE_ENABLED, ScormBuildCache
 
 # Try to import your project's GPT wrapper. If missing, fallback to None.
 try:
@@ -11,10 +21,39 @@ try:
 except Exception:
     call_gpt = None
 
-
-def _ask_gpt_for_questions(course_text: str, assessment_type: str) -> Optional[list]:
+# Bump when rendering changes so cached builds are not reused
+SCORM_EXPORTER_VERSION = "6"
+
+# Package compression: stored | deflate | bzip2 | lzma (+ level where the method supports one)
+SCORM_COMPRESSION = os.getenv("SCORM_COMPRESSION", "deflate")
+SCORM_COMPRESSION_LEVEL = os.getenv("SCORM_COMPRESSION_LEVEL")
+SCORM_MINIFY_HTML = os.getenv("SCORM_MINIFY_HTML", "false").lower() in ("1", "true", "yes")
+# single: one index.html with every module; multi: one SCO page per module + shared course.css
+SCORM_EXPORT_MODE = os.getenv("SCORM_EXPORT_MODE", "single")
+EXPORT_MODES = ("single", "multi")
+SCORM_FRAGMENT_CACHE_SIZE = int(os.getenv("SCORM_FRAGMENT_CACHE_SIZE", "2048"))
+# A bank of SCORM_QUESTION_BANK_SIZE questions is generated per chunk of modules (at most
+# SCORM_QUESTION_CHUNKS chunks, in parallel), cached per outline and shipped in
+# assessment.html, which samples SCORM_ASSESSMENT_QUESTIONS of them per attempt
+SCORM_ASSESSMENT_QUESTIONS = int(os.getenv("SCORM_ASSESSMENT_QUESTIONS", "5"))
+SCORM_QUESTION_BANK_SIZE = int(os.getenv("SCORM_QUESTION_BANK_SIZE", "30"))
+SCORM_QUESTION_CHUNKS = int(os.getenv("SCORM_QUESTION_CHUNKS", "8"))
+SCORM_QUESTION_WORKERS = int(os.getenv("SCORM_QUESTION_WORKERS", "8"))
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+
+QUESTION_SOURCE_CHARS = 4000
+
+
+def _ask_gpt_for_questions(course_text: str, assessment_type: str, count: int = 5) -> Optional[list]:
     """
-    Ask the GPT engine to generate 5 contextual questions based on course_text.
+    Ask the GPT engine to generate `count` contextual questions based on course_text.
     Expected JSON structure from GPT:
     [
       {
@@ -32,10 +71,12 @@ def _ask_gpt_for_questions(course_text: str, assessment_type: str) -> Optional[l
     if call_gpt is None:
         return None
 
+    wanted = "tf" if _all_match_requested_type([{"type": "tf"}], assessment_type) else "mcq"
     system_prompt = (
         "You are a helpful assistant that creates short assessment questions "
         "from a course text. Return ONLY a JSON array (no explanation). "
-        "Create exactly 5 questions.\n\n"
+        f"Every question must be of type '{wanted}'. "
+        f"Create exactly {count} questions.\n\n"
         "Each question item must be an object with these fields:\n"
         "- q: question text (string)\n"
         "- type: 'mcq' or 'tf'\n"
@@ -45,10 +86,12 @@ def _ask_gpt_for_questions(course_text: str, assessment_type: str) -> Optional[l
         "Make questions based on the course content provided. Keep options concise."
     )
 
-    prompt = f"{system_prompt}\n\nCourse text:\n{course_text[:4000]}"  # limit length
+    prompt = f"{system_prompt}\n\nCourse text:\n{course_text[:QUESTION_SOURCE_CHARS]}"  # limit length
 
     try:
-        raw = call_gpt(prompt)
+        # not through the response cache: a malformed reply must not be replayed on every
+        # rebuild, and validated sets are cached per chunk by ScormBuildCache.set_questions
+        raw = call_gpt(prompt, use_cache=False, caller="questions")
         txt = raw.strip()
         # remove ```json or ``` wrappers if present
         if txt.startswith("```"):
@@ -61,7 +104,7 @@ def _ask_gpt_for_questions(course_text: str, assessment_type: str) -> Optional[l
         if start != -1 and end != -1:
             txt = txt[start:end+1]
         questions = json.loads(txt)
-        if not isinstance(questions, list) or len(questions) != 5:
+        if not isinstance(questions, list) or len(questions) != count:
             return None
         validated = []
         for q in questions:
@@ -150,31 +193,24 @@ def _all_match_requested_type(qs: list, requested: str) -> bool:
     return True
 
 
-def _render_assessment_html(course_title: str, questions: list, attempts: Optional[int], course_id: str):
+def _render_assessment_html(course_title: str, questions: list, attempts: Optional[int], course_id: str,
+                            assessment_type: Optional[str] = None):
     """
     Build the assessment HTML for given questions.
-    - questions: list of dicts (see structure above)
+    - questions: list of dicts (see structure above); an empty list gets the fallback questions
     - attempts: optional int, limit of attempts
     - course_id: unique id to store attempts in localStorage
     """
     safe_title = html.escape(course_title)
-    total = len(questions)
-
-    # build questions HTML
-    q_html = ""
-    for i, q in enumerate(questions, start=1):
-        q_html += f"<div class='question'><h4>{i}. {html.escape(q['q'])}</h4>\n"
-        if q["type"] == "mcq":
-            opts = q["options"]
-            for oi, opt in enumerate(opts):
-                is_correct = "true" if (oi == q.get("answer_index", 0)) else "false"
-                q_html += (f"<label><input type='radio' name='q{i}' value='{oi}' data-correct='{is_correct}'> "
-                           f"{html.escape(opt)}</label><br>\n")
-        else:  # tf
-            correct_is_true = (str(q.get("answer", "True")).strip().lower().startswith("t"))
-            q_html += (f"<label><input type='radio' name='q{i}' value='True' data-correct='{'true' if correct_is_true else 'false'}'> True</label><br>\n")
-            q_html += (f"<label><input type='radio' name='q{i}' value='False' data-correct='{'true' if not correct_is_true else 'false'}'> False</label><br>\n")
-        q_html += "</div><hr/>\n"
+    if not questions:
+        # an empty bank would make every attempt score 0/0
+        print(f"[WARN] No assessment questions for {course_title}, using the fallback questions")
+        questions = _fallback_questions(course_title, assessment_type)
+    total = max(1, min(SCORM_ASSESSMENT_QUESTIONS, len(questions)))
+
+    # the whole bank ships with the page; each attempt renders a random sample of it
+    bank = [{k: q[k] for k in ("q", "type", "options", "answer_index", "answer") if k in q} for q in questions]
+    bank_json = json.dumps(bank, ensure_ascii=False).replace("</", "<\\/")
 
     attempts_html = ""
     if attempts:
@@ -184,6 +220,7 @@ def _render_assessment_html(course_title: str, questions: list, attempts: Option
     # Includes Reset Attempts UI which either calls RESET_ENDPOINT (if configured) or clears localStorage.
     submit_js = f"""
 <script>
+const BANK = {bank_json};
 const TOTAL = {total};
 const COURSE_KEY = 'attempts_{course_id}';
 const RESET_ENDPOINT = null; // set to a URL string if you implement server-side reset
@@ -197,6 +234,55 @@ function setAttemptsUsed(n) {{
     localStorage.setItem(COURSE_KEY, String(n));
 }}
 
+function sampleQuestions() {{
+    // partial Fisher-Yates shuffle: a fresh random subset of the bank per attempt
+    const pool = BANK.slice();
+    for (let i = 0; i < Math.min(TOTAL, pool.length); i++) {{
+        const j = i + Math.floor(Math.random() * (pool.length - i));
+        const t = pool[i]; pool[i] = pool[j]; pool[j] = t;
+    }}
+    return pool.slice(0, TOTAL);
+}}
+
+function addOption(div, name, value, text, correct) {{
+    const label = document.createElement('label');
+    const input = document.createElement('input');
+    input.type = 'radio';
+    input.name = name;
+    input.value = value;
+    input.dataset.correct = correct ? 'true' : 'false';
+    label.appendChild(input);
+    label.appendChild(document.createTextNode(' ' + text));
+    div.appendChild(label);
+    div.appendChild(document.createElement('br'));
+}}
+
+function renderQuestions() {{
+    const container = document.getElementById('questions');
+    container.innerHTML = '';
+    sampleQuestions().forEach(function (q, idx) {{
+        const i = idx + 1;
+        const div = document.createElement('div');
+        div.className = 'question';
+        const h = document.createElement('h4');
+        h.textContent = i + '. ' + q.q;
+        div.appendChild(h);
+        if (q.type === 'mcq') {{
+            q.options.forEach(function (opt, oi) {{
+                addOption(div, 'q' + i, String(oi), opt, oi === (q.answer_index || 0));
+            }});
+        }} else {{
+            const correctIsTrue = String(q.answer === undefined ? 'True' : q.answer).trim().toLowerCase().startsWith('t');
+            addOption(div, 'q' + i, 'True', 'True', correctIsTrue);
+            addOption(div, 'q' + i, 'False', 'False', !correctIsTrue);
+        }}
+        container.appendChild(div);
+        container.appendChild(document.createElement('hr'));
+    }});
+    document.getElementById('result').innerText = '';
+    document.getElementById('next-attempt').style.display = 'none';
+}}
+
 function checkAnswers() {{
     const attemptsAllowed = {attempts if attempts else 'null'};
     let used = getAttemptsUsed();
@@ -220,7 +306,7 @@ function checkAnswers() {{
             correctCount++;
         }}
     }}
-    const percent = Math.round((correctCount / TOTAL) * 100);
+    const percent = TOTAL > 0 ? Math.round((Math.min(correctCount, TOTAL) / TOTAL) * 100) : 0;
     if (percent >= 70) {{
         document.getElementById('result').innerText = "Score: " + percent + "%." + " Status: Passed. Your completion has been recorded.";
     }} else {{
@@ -232,8 +318,11 @@ function checkAnswers() {{
         setAttemptsUsed(used + 1);
         if (used + 1 >= attemptsAllowed) {{
             document.getElementById('reset-area').style.display = 'block';
+            return false;
         }}
     }}
+    // a retake gets a new sample of questions
+    document.getElementById('next-attempt').style.display = 'inline-block';
     return false; // prevent actual form submit
 }}
 
@@ -246,19 +335,24 @@ function requestRetake() {{
                 localStorage.removeItem(COURSE_KEY);
                 alert('Retake granted. You may attempt the quiz again.');
                 document.getElementById('reset-area').style.display = 'none';
+                renderQuestions();
             }})
             .catch(e => {{
                 alert('Reset request failed. For now local reset will be performed.');
                 localStorage.removeItem(COURSE_KEY);
                 document.getElementById('reset-area').style.display = 'none';
+                renderQuestions();
             }});
     }} else {{
         // No server endpoint configured — do local clear (developer/testing)
         localStorage.removeItem(COURSE_KEY);
         alert('Local attempts cleared. You may attempt again (client-side only).');
         document.getElementById('reset-area').style.display = 'none';
+        renderQuestions();
     }}
 }}
+
+renderQuestions();
 </script>
 """
 
@@ -287,9 +381,10 @@ function requestRetake() {{
   <p>Answer all questions below. Select the best option for each. When finished, click "Submit Quiz & Complete". A minimum score of 70% is required to pass.</p>
   {attempts_html}
   <form onsubmit="return checkAnswers();">
-    {q_html}
+    <div id="questions"></div>
     <div class="submit">
       <button type="submit">Submit Quiz & Complete</button>
+      <button type="button" id="next-attempt" style="display:none;" onclick="renderQuestions()">Start Next Attempt</button>
     </div>
     <div id="result"></div>
   </form>
@@ -301,60 +396,7 @@ function requestRetake() {{
     return html_page
 
 
-import re
-
-def _parse_course_content(course_text: str):
-    modules = []
-
-    # Split modules correctly
-    raw_modules = re.split(r"-{10,}\s*", course_text)
-
-    for block in raw_modules:
-        if not block.strip():
-            continue
-
-        # Extract module title
-        title_match = re.search(r"Module\s+\d+:\s*(.*)", block)
-        if not title_match:
-            continue
-
-        module_title = title_match.group(1).strip()
-
-        # Remove title line from content
-        content = block.split("\n", 1)
-        content_body = content[1] if len(content) > 1 else ""
-
-        # Split sections (1., 2., 3., 4.)
-        sections = re.split(r"\n\d+\.\s", content_body)
-
-        parsed_sections = []
-        for sec in sections:
-            if not sec.strip():
-                continue
-
-            lines = sec.strip().split("\n", 1)
-            sec_title = lines[0].strip()
-            sec_content = lines[1].strip() if len(lines) > 1 else ""
-
-            parsed_sections.append({
-                "title": sec_title,
-                "content": sec_content
-            })
-
-        modules.append({
-            "title": module_title,
-            "pages": parsed_sections
-        })
-
-    return modules
-
-def _render_course_html(modules):
-    html_content = """
-    <html>
-    <head>
-        <meta charset='utf-8'>
-        <title>Course</title>
-        <style>
+_COURSE_CSS = """
             body { font-family: Arial; padding: 20px; background:#f5f7fa; }
             h1 { text-align:center; }
             .module { margin-bottom: 30px; }
@@ -379,119 +421,166 @@ def _render_course_html(modules):
                 line-height:1.6;
                 color:#333;
             }
-        </style>
+        """
+
+_COURSE_HEAD = """
+    <html>
+    <head>
+        <meta charset='utf-8'>
+        <title>Course</title>
+        <style>""" + _COURSE_CSS + """</style>
     </head>
     <body>
         <h1>Course Content</h1>
     """
 
-    for idx, mod in enumerate(modules, start=1):
-        html_content += f"""
+_MODULE_OPEN = """
         <div class='module'>
-            <h2>Module {idx}: {html.escape(mod['title'])}</h2>
+            <h2>Module {idx}: {title}</h2>
         """
 
-        for page in mod["pages"]:
-            # formatted = html.escape(page["content"]).replace("\n", "<br>")
-            formatted = html.escape(page["content"])
-
-            formatted = formatted.replace("Explanation:", "<br><b>Explanation:</b>")
-            formatted = formatted.replace("Syntax:", "<br><b>Syntax:</b>")
-            formatted = formatted.replace("Example:", "<br><b>Example:</b>")
-            formatted = formatted.replace("Subtopics:", "<br><b>Subtopics:</b>")
-            formatted = formatted.replace("Subtopic Explanation:", "<br><b>Subtopic Explanation:</b>")
-
-            formatted = formatted.replace("\n", "<br>")
-            # html_content += f"""
-            # <div class='card'>
-            #     <details>
-            #         <summary>{html.escape(page['title'])}</summary>
-            #         <div class='content'>{formatted}</div>
-            #     </details>
-            # </div>
-            # """
-            
-            # Skip collapse for module title
-            if page['title'].lower().startswith("module"):
-                html_content += f"""
+_TITLE_CARD = """
                 <div class='card'>
                     <div style="font-weight:bold; font-size:16px;">
-                        {html.escape(page['title'])}
+                        {title}
                     </div>
                 </div>
                 """
-            else:
-                html_content += f"""
+
+_SECTION_CARD = """
                 <div class='card'>
                     <details>
-                        <summary>▶ {html.escape(page['title'])}</summary>
-                        <div class='content'>{formatted}</div>
+                        <summary>▶ {title}</summary>
+                        <div class='content'>{content}</div>
                     </details>
                 </div>
     """
 
-        html_content += "</div>"
-
-    html_content += "</body></html>"
-    return html_content
-
-def generate_scorm(course_text: str, output_dir: str = "scorm_package",
-                   assessment_type: Optional[str] = None, attempts: Optional[int] = None, course_id: str = "default_course") -> str:
-    """
-    Generate a minimal SCORM package with:
-      - index.html containing course_text and a link to assessment (if assessment_type provided)
-      - assessment.html with 5 questions (MCQ or True/False) generated from GPT (fallback deterministic)
-      - imsmanifest.xml listing both resources
-    Returns path to zip file.
-    """
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Save index.html with link to assessment if applicable
-    # index_html = "<html><head><meta charset='utf-8'><title>Course</title></head><body>"
-    # index_html += f"<h1>Course Content</h1>\n<pre>{html.escape(course_text)}</pre>\n"
-    # if assessment_type:
-    #     index_html += f"<hr/><p><a href='assessment.html'>Go to final assessment</a></p>\n"
-    # index_html += "</body></html>"
-
-    # Parse + render structured content
-    modules = _parse_course_content(course_text)
-    index_html = _render_course_html(modules)
- 
-    # Add assessment link if needed
-    if assessment_type:
-        index_html = index_html.replace(
-            "</body>",
-            "<hr/><p><a href='assessment.html'>Go to final assessment</a></p></body>"
-        )
-    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
-        f.write(index_html)
+# html.escape's replacements, in its order. str.replace always counts the
+# whole string first, while `in` is a memchr scan, so a section only pays for
+# the characters it actually contains.
+_ESCAPES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"), ('"', "&quot;"), ("'", "&#x27;"))
+
+# Section markers rendered bold. "Subtopic Explanation:" is already covered by
+# "Explanation:". Every marker ends at a colon and none is a suffix of another,
+# so one split on ":" finds them all instead of a str.replace pass per marker.
+_MARKER_STEMS = ("Explanation", "Syntax", "Example", "Subtopics")
+
+
+def _format_section(content: str) -> str:
+    """html.escape, bold markers, <br> line breaks (same output as the chained replaces it replaced)."""
+    formatted = content
+    for char, entity in _ESCAPES:
+        if char in formatted:
+            formatted = formatted.replace(char, entity)
+    if ":" in formatted:
+        pieces = formatted.split(":")
+        for i in range(len(pieces) - 1):
+            piece = pieces[i]
+            if piece.endswith(_MARKER_STEMS):
+                stem = next(stem for stem in _MARKER_STEMS if piece.endswith(stem))
+                pieces[i] = f"{piece[:-len(stem)]}<br><b>{stem}"
+                pieces[i + 1] = f"</b>{pieces[i + 1]}"
+        formatted = ":".join(pieces)
+    if "\n" in formatted:
+        formatted = formatted.replace("\n", "<br>")
+    return formatted
+
+
+def _render_module_html(idx: int, mod: Module) -> str:
+    parts = [_MODULE_OPEN.format(idx=idx, title=html.escape(mod.title))]
+
+    for section in mod.sections:
+        # Skip collapse for module title
+        if section.title.lower().startswith("module"):
+            parts.append(_TITLE_CARD.format(title=html.escape(section.title)))
+        else:
+            parts.append(_SECTION_CARD.format(title=html.escape(section.title),
+                                              content=_format_section(section.content)))
+
+    parts.append("</div>")
+    return "".join(parts)
+
+
+# Rendered module fragments keyed by (position, module source hash): after an
+# edit only the modules whose text changed are rendered again. Kept in memory
+# and in the build cache, so that also holds after a restart or on another worker.
+_fragments: "OrderedDict[Tuple[int, str], str]" = OrderedDict()
+_fragments_lock = threading.Lock()
+_fragment_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def _module_fragment(idx: int, mod: Module) -> str:
+    if not mod.source_hash:
+        return _render_module_html(idx, mod)
+    key = (idx, mod.source_hash)
+    with _fragments_lock:
+        fragment = _fragments.get(key)
+        if fragment is not None:
+            _fragments.move_to_end(key)
+            _fragment_stats["hits"] += 1
+            return fragment
+    disk_key = ScormBuildCache.make_key(fragment=mod.source_hash, idx=idx, exporter=SCORM_EXPORTER_VERSION)
+    fragment = _build_cache.get_fragment(disk_key) if _build_cache is not None else None
+    stat = "disk_hits"
+    if fragment is None:
+        stat = "misses"
+        fragment = _render_module_html(idx, mod)
+        if _build_cache is not None:
+            _build_cache.set_fragment(disk_key, fragment)
+    with _fragments_lock:
+        _fragment_stats[stat] += 1
+        _fragments[key] = fragment
+        while len(_fragments) > SCORM_FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return fragment
+
+
+def _render_course_html(course: Course):
+    parts = [_COURSE_HEAD]
+    for idx, mod in enumerate(course.modules, start=1):
+        parts.append(_module_fragment(idx, mod))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+_MODULE_PAGE = """<!doctype html>
+<html>
+<head>
+  <meta charset='utf-8'>
+  <title>Module {idx}: {title}</title>
+  <link rel='stylesheet' href='course.css'>
+</head>
+<body>
+{fragment}
+<p class='pager'>{nav}</p>
+</body></html>
+"""
 
-    # If assessment requested, generate questions via GPT (or fallback) and enforce type
-    has_assessment = False
-    questions = None
-    if assessment_type:
-        # Try to get contextual questions from GPT
-        questions = _ask_gpt_for_questions(course_text, assessment_type)
 
-        # Enforce requested assessment type exactly. If GPT output doesn't match, discard it.
-        if not _all_match_requested_type(questions, assessment_type):
-            questions = None
+def _module_page_name(idx: int) -> str:
+    return f"module_{idx:02d}.html"
 
-        if not questions:
-            # fallback deterministic questions of the requested type
-            first_line = course_text.splitlines()[0] if course_text else "Course"
-            questions = _fallback_questions(first_line, assessment_type)
 
-        has_assessment = True
+def _render_module_pages(course: Course, has_assessment: bool) -> Dict[str, str]:
+    """Multi-SCO mode: one page per module, all sharing course.css."""
+    pages = {}
+    count = len(course.modules)
+    for idx, mod in enumerate(course.modules, start=1):
+        nav = []
+        if idx > 1:
+            nav.append(f"<a href='{_module_page_name(idx - 1)}'>&larr; Previous module</a>")
+        if idx < count:
+            nav.append(f"<a href='{_module_page_name(idx + 1)}'>Next module &rarr;</a>")
+        elif has_assessment:
+            nav.append("<a href='assessment.html'>Go to final assessment</a>")
+        pages[_module_page_name(idx)] = _MODULE_PAGE.format(
+            idx=idx, title=html.escape(mod.title), fragment=_module_fragment(idx, mod), nav=" | ".join(nav))
+    return pages
 
-        # create a course-unique id for localStorage usage: sanitize folder name
-        # course_id = os.path.basename(output_dir).replace(' ', '_').lower()
-        course_id = course_id or os.path.basename(output_dir)
-        assessment_html = _render_assessment_html(os.path.basename(output_dir), questions, attempts, course_id)
-        with open(os.path.join(output_dir, "assessment.html"), "w", encoding="utf-8") as f:
-            f.write(assessment_html)
 
-    # Build manifest with index and optional assessment
+def _render_manifest(has_assessment: bool, course: Optional[Course] = None) -> str:
+    """Single-page manifest by default; one item/SCO per module when `course` is given."""
     manifest_header = """<?xml version="1.0" encoding="UTF-8"?>
 <manifest identifier="com.example.ai-course"
     version="1.0"
@@ -503,11 +592,37 @@ def generate_scorm(course_text: str, output_dir: str = "scorm_package",
     <organization identifier="org1">
       <title>AI Generated Course</title>
 """
-    item_index = """
+    if course is None:
+        item_index = """
       <item identifier="item1" identifierref="resource1" isvisible="true">
         <title>Lesson 1</title>
       </item>
 """
+        resource_index = """    <resource identifier="resource1" type="webcontent" adlcp:scormType="sco" href="index.html">
+      <file href="index.html"/>
+    </resource>
+"""
+    else:
+        items = []
+        resources = []
+        for idx, mod in enumerate(course.modules, start=1):
+            page = _module_page_name(idx)
+            items.append(f"""
+      <item identifier="item_m{idx}" identifierref="resource_m{idx}" isvisible="true">
+        <title>Module {idx}: {html.escape(mod.title)}</title>
+      </item>
+""")
+            resources.append(f"""    <resource identifier="resource_m{idx}" type="webcontent" adlcp:scormType="sco" href="{page}">
+      <file href="{page}"/>
+      <dependency identifierref="resource_shared"/>
+    </resource>
+""")
+        resources.append("""    <resource identifier="resource_shared" type="webcontent" adlcp:scormType="asset">
+      <file href="course.css"/>
+    </resource>
+""")
+        item_index = "".join(items)
+        resource_index = "".join(resources)
     item_assessment = ""
     if has_assessment:
         item_assessment = """
@@ -521,9 +636,6 @@ def generate_scorm(course_text: str, output_dir: str = "scorm_package",
   </organizations>
 
   <resources>
-    <resource identifier="resource1" type="webcontent" adlcp:scormType="sco" href="index.html">
-      <file href="index.html"/>
-    </resource>
 """
     resource_assessment = ""
     if has_assessment:
@@ -538,30 +650,413 @@ def generate_scorm(course_text: str, output_dir: str = "scorm_package",
 </manifest>
 """
 
-    manifest = manifest_header + item_index + item_assessment + manifest_middle + resource_assessment + manifest_footer
+    return (manifest_header + item_index + item_assessment + manifest_middle + resource_index
+            + resource_assessment + manifest_footer)
+
+
+_question_executor = ThreadPoolExecutor(max_workers=max(1, SCORM_QUESTION_WORKERS),
+                                        thread_name_prefix="scorm-questions")
+
+
+def question_chunks(module_count: int) -> List[List[int]]:
+    """Contiguous groups of module positions (0-based) that share one question call."""
+    chunk_count = min(module_count, max(1, SCORM_QUESTION_CHUNKS))
+    if chunk_count == 0:
+        return []
+    size, extra = divmod(module_count, chunk_count)
+    chunks, start = [], 0
+    for i in range(chunk_count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(list(range(start, end)))
+        start = end
+    return chunks
+
+
+def _module_text(mod: Module) -> str:
+    return "\n".join([mod.title] + [f"{s.title}\n{s.content}" for s in mod.sections])
+
+
+def _chunk_source(modules: List[Module]) -> str:
+    # every module in the chunk gets an equal share of the prompt budget
+    budget = QUESTION_SOURCE_CHARS // max(1, len(modules))
+    return "\n\n".join(_module_text(mod)[:budget] for mod in modules)
+
+
+def _cached_questions(source: str, assessment_type: str, count: int) -> Optional[list]:
+    """
+    `count` questions generated from `source`, cached by that text so they are
+    only regenerated when it changes. None when GPT fails or returns the wrong type.
+    """
+    key = None
+    if _build_cache is not None:
+        key = ScormBuildCache.make_key(source=outline_hash(source), assessment_type=assessment_type,
+                                       count=count, exporter=SCORM_EXPORTER_VERSION)
+        questions = _build_cache.get_questions(key)
+        if questions:
+            return questions
+
+    questions = _ask_gpt_for_questions(source, assessment_type, count=count)
+
+    # Enforce requested assessment type exactly. If GPT output doesn't match, discard it.
+    if not _all_match_requested_type(questions, assessment_type):
+        return None
+    if key is not None:
+        _build_cache.set_questions(key, questions)
+    return questions
 
-    with open(os.path.join(output_dir, "imsmanifest.xml"), "w", encoding="utf-8") as f:
-        f.write(manifest)
 
-    # Zip the folder (save zip inside the same folder)
-    zip_name = f"{os.path.basename(output_dir)}.zip"
-    zip_path = os.path.join(output_dir, zip_name)
+def questions_per_chunk(chunk_count: int) -> int:
+    """How many questions each chunk contributes to the bank."""
+    return -(-max(SCORM_QUESTION_BANK_SIZE, SCORM_ASSESSMENT_QUESTIONS) // max(1, chunk_count))
 
-    # remove existing zip if present
-    if os.path.exists(zip_path):
+
+def chunk_questions(modules: List[Module], assessment_type: str, count: int) -> Optional[list]:
+    """Questions for one chunk of modules (see question_chunks)."""
+    return _cached_questions(_chunk_source(modules), assessment_type, count)
+
+
+def _start_question_pool(course: Course, course_text: str, assessment_type: str) -> List[Future]:
+    if not course.modules:
+        # nothing to split on: ask about the outline as a whole
+        return [_question_executor.submit(_cached_questions, course_text[:QUESTION_SOURCE_CHARS],
+                                          assessment_type, questions_per_chunk(1))]
+    chunks = question_chunks(len(course.modules))
+    count = questions_per_chunk(len(chunks))
+    return [_question_executor.submit(chunk_questions, [course.modules[i] for i in chunk], assessment_type, count)
+            for chunk in chunks]
+
+
+def _merge_question_pool(futures: List[Future], course_text: str, assessment_type: str) -> Tuple[list, bool]:
+    """
+    Round-robin over the chunks so any sample of the bank covers the whole
+    course. Returns (bank, complete); an incomplete bank is padded with the
+    fallback questions.
+    """
+    count = max(SCORM_QUESTION_BANK_SIZE, SCORM_ASSESSMENT_QUESTIONS)
+    results = []
+    for future in futures:
         try:
-            os.remove(zip_path)
-        except Exception:
-            pass
-
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for root, _, files in os.walk(output_dir):
-            for file in files:
-                full_path = os.path.join(root, file)
-                arcname = os.path.relpath(full_path, output_dir)
-                # don't include the zip itself
-                if file == zip_name:
-                    continue
-                zipf.write(full_path, arcname=arcname)
-
-    return zip_path
\ No newline at end of file
+            results.append(future.result() or [])
+        except Exception as e:
+            print(f"[WARN] Question chunk failed: {e}")
+            results.append([])
+
+    pool, seen = [], set()
+    for round_ in range(max((len(r) for r in results), default=0)):
+        for chunk in results:
+            if round_ < len(chunk):
+                text = chunk[round_]["q"].strip().lower()
+                if text not in seen:
+                    seen.add(text)
+                    pool.append(chunk[round_])
+    questions = pool[:count]
+    complete = len(questions) == count
+
+    if len(questions) < max(1, SCORM_ASSESSMENT_QUESTIONS):
+        # fallback deterministic questions of the requested type (not cached, so GPT is retried next time)
+        first_line = course_text.splitlines()[0] if course_text else "Course"
+        questions += _fallback_questions(first_line, assessment_type)[:max(1, SCORM_ASSESSMENT_QUESTIONS) - len(questions)]
+    return questions, complete
+
+
+def _bank_key(course_text: str, assessment_type: str) -> str:
+    return ScormBuildCache.make_key(bank=outline_hash(course_text), assessment_type=assessment_type,
+                                    size=SCORM_QUESTION_BANK_SIZE, exporter=SCORM_EXPORTER_VERSION)
+
+
+def question_bank(course: Course, course_text: str, assessment_type: str) -> Tuple[list, Optional[List[Future]]]:
+    """
+    The cached bank for this outline, or (None, futures) generating it; pass
+    the futures to _finish_question_bank once the rest of the package is rendered.
+    """
+    if _build_cache is not None:
+        bank = _build_cache.get_questions(_bank_key(course_text, assessment_type))
+        if bank:
+            return bank, None
+    return None, _start_question_pool(course, course_text, assessment_type)
+
+
+def get_question_bank(course_text: str, assessment_type: str) -> Optional[list]:
+    """The cached bank for this outline, if one was generated (kept in meta.json so rebuilds can reuse it)."""
+    if _build_cache is None or not assessment_type:
+        return None
+    return _build_cache.get_questions(_bank_key(course_text, assessment_type))
+
+
+def _finish_question_bank(futures: List[Future], course_text: str, assessment_type: str) -> list:
+    bank, complete = _merge_question_pool(futures, course_text, assessment_type)
+    if complete and _build_cache is not None:
+        _build_cache.set_questions(_bank_key(course_text, assessment_type), bank)
+    return bank
+
+
+def _export_mode(mode: Optional[str]) -> str:
+    mode = (mode or SCORM_EXPORT_MODE).strip().lower()
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Unknown SCORM export mode '{mode}' (expected one of {', '.join(EXPORT_MODES)})")
+    return mode
+
+
+def _render_scorm_files(course_text: str, course_name: str, assessment_type: Optional[str],
+                        attempts: Optional[int], course_id: str, mode: Optional[str] = None,
+                        questions: Optional[list] = None) -> Tuple[Dict[str, str], Optional[list]]:
+    files = {}
+
+    # Parse (memoized by outline hash), then generate the question bank (unless cached) while the HTML renders
+    course = parse_outline_cached(course_text)
+    question_futures = None
+    if not assessment_type:
+        questions = None
+    elif not questions:
+        questions, question_futures = question_bank(course, course_text, assessment_type)
+
+    if _export_mode(mode) == "multi":
+        files.update(_render_module_pages(course, bool(assessment_type)))
+        files["course.css"] = _COURSE_CSS
+        manifest_course = course
+    else:
+        index_html = _render_course_html(course)
+
+        # Add assessment link if needed
+        if assessment_type:
+            index_html = index_html.replace(
+                "</body>",
+                "<hr/><p><a href='assessment.html'>Go to final assessment</a></p></body>"
+            )
+        files["index.html"] = index_html
+        manifest_course = None
+
+    # If assessment requested, generate questions via GPT (or fallback) and enforce type
+    if assessment_type:
+        if question_futures is not None:
+            questions = _finish_question_bank(question_futures, course_text, assessment_type)
+
+        # course-unique id for localStorage usage
+        course_id = course_id or course_name
+        files["assessment.html"] = _render_assessment_html(course_name, questions, attempts, course_id,
+                                                           assessment_type)
+
+    files["imsmanifest.xml"] = _render_manifest(questions is not None, manifest_course)
+    return files, questions
+
+
+def render_scorm_files(course_text: str, course_name: str, assessment_type: Optional[str] = None,
+                       attempts: Optional[int] = None, course_id: str = "default_course",
+                       mode: Optional[str] = None) -> Dict[str, str]:
+    """
+    Render the package contents without touching disk: {archive name: text}.
+      - single mode: index.html containing course_text and a link to assessment (if assessment_type provided)
+      - multi mode: module_NN.html per module + course.css, one SCO each
+      - assessment.html with a bank of MCQ or True/False questions generated from GPT (fallback deterministic),
+        sampled per attempt
+      - imsmanifest.xml listing the resources
+    """
+    return _render_scorm_files(course_text, course_name, assessment_type, attempts, course_id, mode)[0]
+
+
+_RAW_BLOCK = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2>)", re.S | re.I)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE_AROUND = re.compile(r"\s*([{};:,>])\s*")
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_RUN = re.compile(r"  +")
+
+
+def _minify_css(css: str) -> str:
+    css = _CSS_COMMENT.sub("", css)
+    css = _WHITESPACE.sub(" ", css)
+    return _CSS_SPACE_AROUND.sub(r"\1", css).replace(";}", "}").strip()
+
+
+def _minify_markup(text: str) -> str:
+    # a newline or a space is kept wherever there was whitespace, so inline spacing is unchanged
+    # (line-based rather than one \s+ regex: several times faster on large pages)
+    body = "\n".join(line for line in (line.strip() for line in text.splitlines()) if line)
+    body = _SPACE_RUN.sub(" ", body.replace("\t", " "))
+    if body and text[:1].isspace():
+        body = "\n" + body
+    if body and text[-1:].isspace():
+        body += "\n"
+    return body
+
+
+def minify_html(page: str) -> str:
+    """
+    Conservative minifier for the generated pages: collapses whitespace runs
+    in markup, compacts <style> CSS, strips indentation and blank lines in
+    <script> (line breaks are kept, so // comments stay safe), and leaves
+    <pre>/<textarea> untouched.
+    """
+    out = []
+    pos = 0
+    for m in _RAW_BLOCK.finditer(page):
+        out.append(_minify_markup(page[pos:m.start()]))
+        open_tag, tag, body, close_tag = m.group(1), m.group(2).lower(), m.group(3), m.group(4)
+        if tag == "style":
+            body = _minify_css(body)
+        elif tag == "script":
+            body = "\n".join(line.strip() for line in body.splitlines() if line.strip())
+        out.append(f"{open_tag}{body}{close_tag}")
+        pos = m.end()
+    out.append(_minify_markup(page[pos:]))
+    return "".join(out).strip()
+
+
+def _compression_settings(compression: Optional[str], level: Optional[int]) -> Tuple[str, int, Optional[int]]:
+    name = (compression or SCORM_COMPRESSION).strip().lower()
+    if name not in COMPRESSION_METHODS:
+        raise ValueError(f"Unknown SCORM compression '{name}' (expected one of {', '.join(COMPRESSION_METHODS)})")
+    if level is None and SCORM_COMPRESSION_LEVEL:
+        level = int(SCORM_COMPRESSION_LEVEL)
+    # only deflate (0-9) and bzip2 (1-9) take a level
+    if name not in ("deflate", "bzip2"):
+        level = None
+    return name, COMPRESSION_METHODS[name], level
+
+
+def package_scorm_files(files: Dict[str, str], compression: Optional[str] = None, level: Optional[int] = None,
+                        minify: Optional[bool] = None) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Zip rendered files in memory. Returns (zip bytes, report) where the report
+    has the raw/minified/zipped sizes and the minify/zip times.
+    """
+    name, method, level = _compression_settings(compression, level)
+    minify = SCORM_MINIFY_HTML if minify is None else minify
+
+    started = time.perf_counter()
+    raw_bytes = sum(len(content.encode("utf-8")) for content in files.values())
+    if minify:
+        files = {arcname: minify_html(content) if arcname.endswith(".html")
+                 else _minify_css(content) if arcname.endswith(".css") else content
+                 for arcname, content in files.items()}
+    minified = time.perf_counter()
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=method, compresslevel=level) as zipf:
+        for arcname, content in files.items():
+            zipf.writestr(arcname, content.encode("utf-8"))
+    data = buffer.getvalue()
+    finished = time.perf_counter()
+
+    content_bytes = sum(len(content.encode("utf-8")) for content in files.values())
+    report = {
+        "compression": name,
+        "level": level,
+        "minify": minify,
+        "raw_bytes": raw_bytes,
+        "content_bytes": content_bytes,
+        "zip_bytes": len(data),
+        "ratio": round(len(data) / raw_bytes, 4) if raw_bytes else 0.0,
+        "minify_ms": round((minified - started) * 1000, 2),
+        "zip_ms": round((finished - minified) * 1000, 2),
+    }
+    return data, report
+
+
+_build_cache = ScormBuildCache() if SCORM_BUILD_CACHE_ENABLED else None
+
+
+def scorm_build_key(course_text: str, course_name: str, assessment_type: Optional[str] = None,
+                    attempts: Optional[int] = None, compression: Optional[str] = None,
+                    level: Optional[int] = None, minify: Optional[bool] = None, mode: Optional[str] = None) -> str:
+    """Identifies a package by everything that shapes it except course_id."""
+    name, _, level = _compression_settings(compression, level)
+    return ScormBuildCache.make_key(
+        outline=outline_hash(course_text),
+        course_name=course_name,
+        assessment_type=assessment_type,
+        attempts=attempts,
+        exporter=SCORM_EXPORTER_VERSION,
+        compression=name,
+        level=level,
+        minify=SCORM_MINIFY_HTML if minify is None else minify,
+        mode=_export_mode(mode),
+    )
+
+
+def _restamp(cached: Dict[str, Any], course_name: str, assessment_type: str, attempts: Optional[int],
+             course_id: str, compression: Optional[str], level: Optional[int], minify: Optional[bool]) -> bytes:
+    """Cached package with only the course_id-dependent assessment page re-rendered."""
+    with zipfile.ZipFile(io.BytesIO(cached["data"])) as zipf:
+        files = {name: zipf.read(name).decode("utf-8") for name in zipf.namelist()}
+    files["assessment.html"] = _render_assessment_html(course_name, cached["questions"], attempts,
+                                                       course_id or course_name, assessment_type)
+    data, _ = package_scorm_files(files, compression, level, minify)
+    return data
+
+
+def build_scorm_package(course_text: str, course_name: str, assessment_type: Optional[str] = None,
+                        attempts: Optional[int] = None, course_id: str = "default_course",
+                        compression: Optional[str] = None, level: Optional[int] = None,
+                        minify: Optional[bool] = None, mode: Optional[str] = None, use_cache: bool = True,
+                        questions: Optional[list] = None) -> bytes:
+    """
+    Build the SCORM zip entirely in memory and return its bytes (ready for upload).
+    Identical builds come from the build cache; when only course_id differs,
+    just assessment.html is re-rendered (no question generation).
+    `questions` is a previously generated bank for this outline (e.g. from meta.json).
+    """
+    cache = _build_cache if use_cache else None
+    key = None
+    if cache is not None:
+        key = scorm_build_key(course_text, course_name, assessment_type, attempts, compression, level, minify, mode)
+        cached = cache.get(key)
+        if cached is not None:
+            if cached["course_id"] == course_id or not assessment_type:
+                cache.record("hits")
+                print(f"[SCORM] {course_name}: build cache hit")
+                return cached["data"]
+            cache.record("restamps")
+            print(f"[SCORM] {course_name}: build cache hit, re-stamped assessment for {course_id}")
+            return _restamp(cached, course_name, assessment_type, attempts, course_id, compression, level, minify)
+
+    files, questions = _render_scorm_files(course_text, course_name, assessment_type, attempts, course_id, mode,
+                                           questions)
+    data, report = package_scorm_files(files, compression, level, minify)
+    _log_report(course_name, report)
+    if cache is not None:
+        cache.set(key, data, course_id, questions)
+    return data
+
+
+def get_build_cache_stats() -> Dict[str, int]:
+    stats = _build_cache.stats() if _build_cache is not None else {}
+    with _fragments_lock:
+        stats.update({f"fragment_{k}": v for k, v in _fragment_stats.items()})
+    return stats
+
+
+REGISTRY.callback(
+    "scorm_build_cache", "SCORM build cache counters (hits, restamps, misses, ...)", "gauge",
+    lambda: [({"stat": k}, v) for k, v in get_build_cache_stats().items()])
+
+
+def _log_report(course_name: str, report: Dict[str, Any]) -> None:
+    print(f"[SCORM] {course_name}: {report['raw_bytes']} -> {report['zip_bytes']} bytes "
+          f"({report['compression']}{'' if report['level'] is None else ':' + str(report['level'])}"
+          f"{', minified' if report['minify'] else ''}; ratio {report['ratio']}, "
+          f"minify {report['minify_ms']} ms, zip {report['zip_ms']} ms)")
+
+
+def generate_scorm(course_text: str, output_dir: str = "scorm_package",
+                   assessment_type: Optional[str] = None, attempts: Optional[int] = None, course_id: str = "default_course",
+                   compression: Optional[str] = None, level: Optional[int] = None, minify: Optional[bool] = None,
+                   mode: Optional[str] = None) -> str:
+    """
+    Generate the SCORM package on disk: the rendered files plus
+    <output_dir>/<basename>.zip. Returns path to zip file.
+    Prefer build_scorm_package when the zip only needs to be uploaded.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    course_name = os.path.basename(os.path.normpath(output_dir))
+    files = render_scorm_files(course_text, course_name, assessment_type, attempts, course_id, mode)
+    for arcname, content in files.items():
+        with open(os.path.join(output_dir, arcname), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    data, report = package_scorm_files(files, compression, level, minify)
+    _log_report(course_name, report)
+    zip_path = os.path.join(output_dir, f"{course_name}.zip")
+    with open(zip_path, "wb") as f:
+        f.write(data)
+
+    return zip_path
@@ -0,0 +1,173 @@
+# singleflight.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: coalesce within the process only
+    fcntl = None
+
+SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR", os.path.join(".cache", "singleflight"))
+SINGLEFLIGHT_POLL_SECONDS = float(os.getenv("SINGLEFLIGHT_POLL_SECONDS", "0.5"))
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv("SINGLEFLIGHT_RESULT_TTL", "300"))
+
+_MISSING = object()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(namespace: str, payload: Dict[str, Any]) -> str:
+    """Stable key for a request: whitespace-normalized payload, sorted keys, hashed."""
+    raw = json.dumps({"ns": namespace, "payload": _normalize(payload)}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent requests onto one computation.
+
+    Within a process, callers with the same key await the same task. Across
+    gunicorn workers, an flock on <dir>/<key>.lock elects one leader; the
+    others wait for the lock and then read the leader's result from
+    <dir>/<key>.json. If the leader failed there is no result, so the next
+    waiter computes it itself. Results must be JSON-serializable.
+    """
+
+    def __init__(self, directory: str = SINGLEFLIGHT_DIR):
+        self.directory = directory
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            # run detached so a cancelled leader request doesn't cancel the followers
+            task = asyncio.ensure_future(self._run(key, fn))
+            self._inflight[key] = task
+
+            def _forget(done: asyncio.Task, key: str = key):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+
+            task.add_done_callback(_forget)
+        else:
+            print(f"[SINGLEFLIGHT] Joining in-flight request {key[:12]}")
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if fcntl is None:
+            return await fn()
+
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = os.path.join(self.directory, f"{key}.lock")
+        result_path = os.path.join(self.directory, f"{key}.json")
+        started = time.time()
+
+        fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            waiting = False
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if not waiting:
+                        print(f"[SINGLEFLIGHT] Waiting for request {key[:12]} running in another worker")
+                        waiting = True
+                    await asyncio.sleep(SINGLEFLIGHT_POLL_SECONDS)
+                    continue
+                if self._is_current(fd, lock_path):
+                    break
+                # _sweep removed the file we opened; lock the one at the path now
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+                fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                # only a result finished after we arrived belongs to "our" request
+                result = self._read_result(result_path, newer_than=started)
+                if result is not _MISSING:
+                    return result
+                result = await fn()
+                self._write_result(result_path, result)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _is_current(fd: int, path: str) -> bool:
+        try:
+            return os.fstat(fd).st_ino == os.stat(path).st_ino
+        except OSError:
+            return False
+
+    @staticmethod
+    def _read_result(path: str, newer_than: float) -> Any:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return _MISSING
+        if data.get("finished_at", 0) < newer_than:
+            return _MISSING
+        return data.get("result")
+
+    def _write_result(self, path: str, result: Any) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"finished_at": time.time(), "result": result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[SINGLEFLIGHT] Could not share result: {e}")
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """
+        Drop results nobody can still be waiting for, and lock files idle as
+        long. A lock file is only removed while we hold its lock; anyone who
+        opened it before that sees it was replaced (_is_current) and retries.
+        """
+        cutoff = time.time() - SINGLEFLIGHT_RESULT_TTL
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if name.endswith(".json"):
+                    os.remove(path)
+                elif name.endswith(".lock"):
+                    self._remove_lock(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_lock(path: str) -> None:
+        fd = os.open(path, os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # in use
+            try:
+                if SingleFlight._is_current(fd, path):
+                    os.remove(path)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)